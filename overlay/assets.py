@@ -0,0 +1,103 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+class Asset(object):
+    __slots__ = ('image', '_photo')
+
+    def __init__(self, image):
+        self.image = image
+        self._photo = None
+
+    @property
+    def photo(self):
+        # PhotoImages need a Tk interpreter, so only build one when a canvas
+        # actually asks for it.
+        if self._photo is None:
+            from PIL import ImageTk
+            self._photo = ImageTk.PhotoImage(self.image)
+        return self._photo
+
+def decode(path):
+    image = Image.open(path)
+    image.load()
+    return image
+
+class AssetCache(object):
+    # Decoded and resized images, keyed by (path, size, resample), with the
+    # least recently used entries evicted once there are more than `capacity`.
+    # Sizes are in layout units and get multiplied by `scale`, so every asset
+    # is resampled once, straight to the size it is drawn at.
+    def __init__(self, capacity=32, scale=1.0):
+        self.capacity = capacity
+        self.scale = scale
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.decodes = 0
+        self.resamples = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _key(self, path, size, resample):
+        if size is not None:
+            size = (max(1, int(size[0] * self.scale)), max(1, int(size[1] * self.scale)))
+        return (path, size, resample if size is not None else None)
+
+    def _insert(self, key, image):
+        asset = Asset(image)
+        self._entries[key] = asset
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        return asset
+
+    def get(self, path, size=None, resample=Image.LANCZOS):
+        key = self._key(path, size, resample)
+        asset = self._entries.get(key)
+        if asset is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return asset
+
+        self.misses += 1
+        if key[1] is None:
+            image = decode(path)
+            self.decodes += 1
+        else:
+            image = self.get(path).image.resize(key[1], resample)
+            self.resamples += 1
+        return self._insert(key, image)
+
+    def preload(self, items, workers=4):
+        # Decode up front, e.g. once before forking processes that all draw
+        # from this cache, or before the first frame. Items are paths, or
+        # (path, size) to also resize to the size something is drawn at. PIL
+        # lets go of the GIL while decoding and resampling, so the images are
+        # done in parallel on `workers` threads; only this thread touches the
+        # cache.
+        items = [(item, None) if isinstance(item, str) else item for item in items]
+        paths = [path for path in dict.fromkeys(path for path, _ in items)
+                 if self._key(path, None, None) not in self._entries]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for path, image in zip(paths, pool.map(decode, paths)):
+                self._insert(self._key(path, None, None), image)
+                self.decodes += 1
+
+            keys = [key for key in dict.fromkeys(self._key(path, size, Image.LANCZOS)
+                                                 for path, size in items if size is not None)
+                    if key not in self._entries]
+            sources = [self.get(key[0]).image for key in keys]
+            for key, image in zip(keys, pool.map(lambda source, key: source.resize(key[1], key[2]),
+                                                 sources, keys)):
+                self._insert(key, image)
+                self.resamples += 1
+
+    def stats(self):
+        return {
+            'entries' : len(self._entries),
+            'hits' : self.hits,
+            'misses' : self.misses,
+            'decodes' : self.decodes,
+            'resamples' : self.resamples,
+        }
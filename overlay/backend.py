@@ -0,0 +1,392 @@
+import math
+import shutil
+import subprocess
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+from overlay.assets import Asset
+from overlay.scene import Scene, FrameStats
+
+# Same spelling as the tkinter constants, so both backends understand them.
+NW, N, NE, W, CENTER, E, SW, S, SE = 'nw', 'n', 'ne', 'w', 'center', 'e', 'sw', 's', 'se'
+
+def scale_coords(coords, scale):
+    if scale == 1:
+        return coords
+    return tuple(c * scale for c in coords)
+
+def scale_font(font, scale):
+    # Tk font tuples put the size second; styles after it stay as they are.
+    if scale == 1:
+        return font
+    return (font[0], font[1] * scale) + tuple(font[2:])
+
+def tk_font(font, scale):
+    # Tk wants whole point sizes.
+    font = scale_font(font, scale)
+    return (font[0], max(1, int(round(font[1])))) + tuple(font[2:])
+
+class CanvasBackend(object):
+    # Draws onto a tk.Canvas through a retained Scene. Coordinates and font
+    # sizes are multiplied by `scale`, so the overlay can lay itself out at
+    # 1920x1080 and still draw into a smaller window.
+    def __init__(self, canvas, scale=1.0):
+        self.scene = Scene(canvas)
+        self.scale = scale
+        self.shape_sprites = ShapeSprites()
+        self._fonts = []
+
+    @property
+    def stats(self):
+        return self.scene.stats
+
+    def begin(self):
+        self.scene.begin()
+
+    def end(self):
+        return self.scene.end()
+
+    def rectangle(self, bbox, **options):
+        self.scene.rectangle(scale_coords(bbox, self.scale), **options)
+
+    def arc(self, bbox, **options):
+        self.scene.arc(scale_coords(bbox, self.scale), **options)
+
+    def oval(self, bbox, **options):
+        self.scene.oval(scale_coords(bbox, self.scale), **options)
+
+    def text(self, xy, **options):
+        if 'font' in options:
+            options['font'] = tk_font(options['font'], self.scale)
+        self.scene.text(scale_coords(xy, self.scale), **options)
+
+    def image(self, xy, image, anchor=CENTER):
+        # Assets come pre-scaled from the AssetCache / FlagPipeline.
+        self.scene.image(scale_coords(xy, self.scale), image=image.photo, anchor=anchor)
+
+    def shapes(self, shapes):
+        # One image item in place of an item per shape.
+        sprite, x, y = self.shape_sprites.place(shapes, self.scale)
+        self.scene.image((x, y), image=sprite.photo, anchor=NW)
+
+    def preload_fonts(self, fonts):
+        # Tk opens a font the first time anything is measured or drawn in it.
+        # Holding on to a Font keeps it open.
+        from tkinter import font as tkfont
+        for font in fonts:
+            f = tkfont.Font(root=self.scene.canvas, font=tk_font(font, self.scale))
+            f.metrics()
+            self._fonts.append(f)
+
+# Tk sizes fonts in points; assume the usual 96 dpi when turning them into
+# pixels for PIL.
+PIXELS_PER_POINT = 96 / 72
+
+_fonts = {}
+_font_files = {}
+
+def find_font_file(family, bold):
+    # Every size of a font is in the same file, so fc-match only runs once
+    # for each family and weight.
+    key = (family, bold)
+    if key in _font_files:
+        return _font_files[key]
+    path = None
+    if shutil.which('fc-match') is not None:
+        pattern = family + (':bold' if bold else '')
+        try:
+            path = subprocess.check_output(['fc-match', '-f', '%{file}', pattern],
+                                           stderr=subprocess.DEVNULL).decode() or None
+        except (OSError, subprocess.CalledProcessError):
+            pass
+    _font_files[key] = path
+    return path
+
+def load_font(font):
+    # `font` is a Tk font tuple: (family, size, style...)
+    font = tuple(font)
+    f = _fonts.get(font)
+    if f is not None:
+        return f
+
+    family, size = font[0], font[1]
+    bold = 'bold' in font[2:]
+    pixels = int(round(abs(size) * PIXELS_PER_POINT))
+    path = find_font_file(family, bold)
+    try:
+        f = ImageFont.truetype(path or 'DejaVuSans.ttf', pixels)
+    except OSError:
+        f = ImageFont.load_default()
+    _fonts[font] = f
+    return f
+
+def load_fonts(fonts, workers=4):
+    # load_font() for several fonts at once, on threads: most of the time goes
+    # to waiting for fc-match and reading font files. Files are looked up
+    # first, so no two threads run fc-match for the same one.
+    fonts = [tuple(font) for font in fonts]
+    files = set((font[0], 'bold' in font[2:]) for font in fonts)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(lambda f: find_font_file(*f), files))
+        list(pool.map(load_font, fonts))
+
+def anchor_offset(anchor, width, height):
+    if anchor in (NW, W, SW):
+        dx = 0
+    elif anchor in (NE, E, SE):
+        dx = -width
+    else:
+        dx = -width / 2
+
+    if anchor in (NW, N, NE):
+        dy = 0
+    elif anchor in (SW, S, SE):
+        dy = -height
+    else:
+        dy = -height / 2
+    return dx, dy
+
+class TextSprites(object):
+    # Rasterized strings, keyed by (text, font, fill, sub-pixel offset), with
+    # the least recently used evicted once there are more than `capacity`. A
+    # sprite is the string in `fill` on a transparent background, so drawing it
+    # is a single alpha composite. The game clock only changes once a second
+    # and most other text far less often, so nearly every frame is all hits.
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._sprites = OrderedDict()
+        self._sizes = {}
+        self._measure = ImageDraw.Draw(Image.new('L', (1, 1)))
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._sprites)
+
+    def measure(self, text, font):
+        # Size of the ink box, which is what anchors position.
+        key = (text, font)
+        size = self._sizes.get(key)
+        if size is None:
+            if len(self._sizes) > self.capacity * 4:
+                self._sizes.clear()
+            left, top, right, bottom = self._measure.multiline_textbbox((0, 0), text,
+                                                                        font=load_font(font))
+            size = self._sizes[key] = (right - left, bottom - top)
+        return size
+
+    def get(self, text, font, fill, offset=(0, 0)):
+        # `font` is an already scaled Tk font tuple. `offset` is where within
+        # its first pixel the ink box starts, in quarters of a pixel like PIL
+        # positions text.
+        key = (text, font, fill, offset)
+        sprite = self._sprites.get(key)
+        if sprite is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+
+        self.misses += 1
+        f = load_font(font)
+        left, top, right, bottom = self._measure.multiline_textbbox((0, 0), text, font=f)
+        underline = 'underline' in font[2:]
+        # Draw at a positive origin, as PIL rounds negative sub-pixel
+        # positions differently, then crop to the ink box plus a pixel of
+        # margin for anti-aliasing.
+        x = 1 + offset[0] / 4
+        y = 1 + offset[1] / 4
+        height = bottom + (4 if underline else 2)
+        # Transparent pixels carry the ink colour too, so edges don't darken
+        # when the sprite is composited.
+        sprite = Image.new('RGBA', (right + 2, height), ImageColor.getrgb(fill)[:3] + (0,))
+        draw = ImageDraw.Draw(sprite)
+        draw.multiline_text((x, y), text, fill=fill, font=f)
+        if underline:
+            draw.line((x + left, y + bottom + 1, x + right, y + bottom + 1), fill=fill)
+        sprite = sprite.crop((left, top, right + 2, height))
+
+        self._sprites[key] = sprite
+        while len(self._sprites) > self.capacity:
+            self._sprites.popitem(last=False)
+        return sprite
+
+def draw_shape(draw, kind, box, fill, outline, start=0, extent=90, width=1):
+    # `box` is in pixels, already normalized so x1 <= x2 and y1 <= y2.
+    fill = fill or None
+    outline = outline or None
+    if kind == 'rectangle':
+        draw.rectangle(box, fill=fill, outline=outline, width=width)
+    elif kind == 'arc':
+        # Tk measures angles counter-clockwise from 3 o'clock, PIL clockwise.
+        draw.pieslice(box, -(start + extent), -start, fill=fill, outline=outline,
+                      width=width)
+    elif kind == 'oval':
+        draw.ellipse(box, fill=fill, outline=outline, width=width)
+
+def pixel_box(bbox, scale):
+    x1, y1, x2, y2 = scale_coords(bbox, scale)
+    return (min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2))
+
+class ShapeSprites(object):
+    # Groups of shapes rasterized together onto one transparent image, such as
+    # the arcs and rectangles of a bordered, rounded panel. They are keyed by
+    # the shapes themselves, relative to the pixel the group starts in, so a
+    # panel of a given size and colour is drawn once and then reused wherever
+    # it sits. Shapes are (kind, bbox, fill, outline, start) in layout units.
+    #
+    # Each group is drawn `supersample` times over and scaled down, so its
+    # edges come out anti-aliased, with the coverage kept in the alpha.
+    def __init__(self, capacity=128, supersample=4):
+        self.capacity = capacity
+        self.supersample = supersample
+        self._sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._sprites)
+
+    def place(self, shapes, scale):
+        # Returns the sprite and the pixel its top left corner goes on.
+        boxes = [pixel_box(shape[1], scale) for shape in shapes]
+        x = math.floor(min(box[0] for box in boxes))
+        y = math.floor(min(box[1] for box in boxes))
+        key = tuple((kind, (box[0] - x, box[1] - y, box[2] - x, box[3] - y), fill, outline, start)
+                    for (kind, _, fill, outline, start), box in zip(shapes, boxes))
+        entry = self._sprites.get(key)
+        if entry is not None:
+            self._sprites.move_to_end(key)
+            self.hits += 1
+            return entry, x, y
+
+        self.misses += 1
+        # PIL includes the far edge of a box, hence the extra pixel.
+        width = math.ceil(max(box[2] for _, box, _, _, _ in key)) + 2
+        height = math.ceil(max(box[3] for _, box, _, _, _ in key)) + 2
+        n = self.supersample
+        image = Image.new('RGBA', (width * n, height * n), (0, 0, 0, 0))
+        draw = ImageDraw.Draw(image)
+        for kind, (x1, y1, x2, y2), fill, outline, start in key:
+            # The far edge pixel becomes n pixels, and the outline stays one
+            # pixel wide once scaled down.
+            draw_shape(draw, kind, (x1 * n, y1 * n, x2 * n + n - 1, y2 * n + n - 1),
+                       fill, outline, start, width=n)
+        sprite = Asset(image.resize((width, height), Image.LANCZOS))
+        self._sprites[key] = sprite
+        while len(self._sprites) > self.capacity:
+            self._sprites.popitem(last=False)
+        return sprite, x, y
+
+class RasterBackend(object):
+    # Rasterizes the same drawing calls into an RGBA PIL image, for rendering
+    # without a display. Defaults follow Tk's: shapes get a black one pixel
+    # outline and text is black unless told otherwise. `size` is the image
+    # size in pixels; coordinates and fonts are multiplied by `scale`.
+    def __init__(self, size, scale=1.0):
+        self.size = (int(size[0]), int(size[1]))
+        self.scale = scale
+        self.frame = None
+        self.draw = None
+        self.items = 0
+        self.stats = FrameStats(0, 0, 0, 0)
+        self.sprites = TextSprites()
+        self.shape_sprites = ShapeSprites()
+
+    def begin(self):
+        self.frame = Image.new('RGBA', self.size, (0, 0, 0, 0))
+        self.draw = ImageDraw.Draw(self.frame)
+        self.items = 0
+
+    def end(self):
+        self.draw = None
+        self.stats = FrameStats(self.items, 0, 0, self.items)
+        return self.frame
+
+    def rectangle(self, bbox, fill=None, outline='#000000'):
+        self.items += 1
+        draw_shape(self.draw, 'rectangle', self._box(bbox), fill, outline)
+
+    def arc(self, bbox, fill=None, outline='#000000', start=0, extent=90):
+        self.items += 1
+        draw_shape(self.draw, 'arc', self._box(bbox), fill, outline, start, extent)
+
+    def oval(self, bbox, fill=None, outline='#000000'):
+        self.items += 1
+        draw_shape(self.draw, 'oval', self._box(bbox), fill, outline)
+
+    def shapes(self, shapes):
+        self.items += 1
+        sprite, x, y = self.shape_sprites.place(shapes, self.scale)
+        self.composite(sprite.image, x, y)
+
+    def text(self, xy, text='', fill='#000000', font=('TkDefaultFont', 10), anchor=CENTER):
+        text = str(text)
+        if not text:
+            return
+        self.items += 1
+        font = scale_font(tuple(font), self.scale)
+        width, height = self.sprites.measure(text, font)
+        dx, dy = anchor_offset(anchor, width, height)
+        x = xy[0] * self.scale + dx
+        y = xy[1] * self.scale + dy
+        ix, iy = math.floor(x), math.floor(y)
+        offset = (int(round((x - ix) * 4)), int(round((y - iy) * 4)))
+        sprite = self.sprites.get(text, font, fill, offset)
+        self.composite(sprite, ix - 1, iy - 1)
+
+    def image(self, xy, image, anchor=CENTER):
+        self.items += 1
+        image = image.image
+        if image.mode != 'RGBA':
+            image = image.convert('RGBA')
+        dx, dy = anchor_offset(anchor, image.width, image.height)
+        self.composite(image, int(round(xy[0] * self.scale + dx)),
+                       int(round(xy[1] * self.scale + dy)))
+
+    def composite(self, image, x, y):
+        # alpha_composite() refuses negative offsets, so clip by hand.
+        if x < 0 or y < 0:
+            image = image.crop((max(0, -x), max(0, -y), image.width, image.height))
+            x, y = max(0, x), max(0, y)
+        if x >= self.size[0] or y >= self.size[1] or image.width == 0 or image.height == 0:
+            return
+        self.frame.alpha_composite(image, (x, y))
+
+    def _box(self, bbox):
+        return pixel_box(bbox, self.scale)
+
+    def preload_fonts(self, fonts):
+        load_fonts([scale_font(tuple(font), self.scale) for font in fonts])
+
+def fill_and_key(frame):
+    # Split an RGBA frame drawn on a transparent background into what a
+    # downstream linear keyer wants: the overlay over black, and its alpha as a
+    # greyscale key. Both come from the same pixels, so they can't drift apart.
+    # The fill is premultiplied by the key, as keyers expect, so anti-aliased
+    # edges don't come out with a fringe.
+    black = Image.new('RGBA', frame.size, (0, 0, 0, 255))
+    return Image.alpha_composite(black, frame).convert('RGB'), frame.getchannel('A')
+
+class FillKeyBackend(RasterBackend):
+    # Rasterizes each frame once and shows it on a tk.Canvas as a fill / key
+    # pair side by side, fill on the left, for a card driving a keyer's two
+    # inputs.
+    def __init__(self, canvas, size, scale=1.0):
+        RasterBackend.__init__(self, size, scale)
+        self.canvas = canvas
+        self._fill = None
+        self._key = None
+
+    def end(self):
+        frame = RasterBackend.end(self)
+        fill, key = fill_and_key(frame)
+        if self._fill is None:
+            from PIL import ImageTk
+            self._fill = ImageTk.PhotoImage(fill)
+            self._key = ImageTk.PhotoImage(key)
+            self.canvas.create_image(0, 0, image=self._fill, anchor=NW)
+            self.canvas.create_image(self.size[0], 0, image=self._key, anchor=NW)
+        else:
+            self._fill.paste(fill)
+            self._key.paste(key)
+        return frame
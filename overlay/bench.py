@@ -0,0 +1,475 @@
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from PIL import ImageChops, ImageFilter, ImageStat
+from uwh.gamemanager import (GameManager, GameState, TimeoutState, Penalty,
+                             TeamColor, PoolLayout)
+from overlay.assets import AssetCache
+from overlay.backend import RasterBackend, draw_shape
+from overlay.headless import HeadlessOverlay
+from overlay.fetch import ScoresFetcher
+from overlay.mock_scores import MockUWHScores, MockTournament, StandInServer
+from overlay.painter import OverlayPainter, MaskKind, startup_assets
+from overlay.profiler import percentile
+from overlay.recording import Recording, ReplayGameManager
+
+# Scripted game timelines. Each one sets up the GameManager and then yields
+# once per frame, advancing the game clock as if frames were `fps` per second
+# of game time.
+
+MOCK_TID = 17
+
+MASKS = {
+    'none' : MaskKind.NONE,
+    'chroma' : MaskKind.CHROMA,
+    'vmac' : MaskKind.VMAC,
+    'luma' : MaskKind.LUMA,
+}
+
+def countdown(mgr, start, frames, fps):
+    for i in range(frames):
+        mgr.setGameClock(max(0, start - i // fps))
+        yield
+
+def pre_game_roster(mgr, frames, fps):
+    mgr.setGid(1)
+    mgr.setGameState(GameState.pre_game)
+    yield from countdown(mgr, 3 * 60, frames, fps)
+
+def first_half_penalties(mgr, frames, fps):
+    mgr.setGid(42)
+    mgr.setGameState(GameState.first_half)
+    mgr.setGameClock(15 * 60)
+    for i in range(8):
+        team = TeamColor.white if i % 2 else TeamColor.black
+        mgr.addPenalty(Penalty(8 + i * 7, team, (i + 1) * 60))
+    for i in range(frames):
+        mgr.setGameClock(15 * 60 - i // fps)
+        if i % (fps * 5) == 0:
+            if (i // (fps * 5)) % 2:
+                mgr.addWhiteGoal(15)
+            else:
+                mgr.addBlackGoal(22)
+        if i == frames // 2:
+            mgr.setTimeoutState(TimeoutState.white)
+        elif i == frames * 3 // 4:
+            mgr.setTimeoutState(TimeoutState.none)
+        yield
+
+def half_time_roster_bar(mgr, frames, fps):
+    mgr.setGid(43)
+    mgr.setGameState(GameState.half_time)
+    mgr.addBlackGoal(22)
+    yield from countdown(mgr, 3 * 60, frames, fps)
+
+def overtime(mgr, frames, fps):
+    mgr.setGid(201)
+    mgr.setGameState(GameState.pre_ot)
+    mgr.setBlackScore(4)
+    mgr.setWhiteScore(4)
+    for i in range(frames):
+        if i == frames // 4:
+            mgr.setGameState(GameState.ot_first)
+        mgr.setGameClock(5 * 60 - i // fps)
+        yield
+
+def sudden_death(mgr, frames, fps):
+    mgr.setGid(240)
+    mgr.setGameState(GameState.pre_sudden_death)
+    mgr.setBlackScore(6)
+    mgr.setWhiteScore(6)
+    for i in range(frames):
+        if i == frames // 4:
+            mgr.setGameState(GameState.sudden_death)
+        elif i == frames // 2:
+            mgr.setTimeoutState(TimeoutState.penalty_shot)
+        mgr.setGameClock(i // fps)
+        yield
+
+def game_over(mgr, frames, fps):
+    mgr.setGid(272)
+    mgr.setGameState(GameState.game_over)
+    mgr.setBlackScore(3)
+    mgr.setWhiteScore(11)
+    yield from countdown(mgr, 3 * 60, frames, fps)
+
+TIMELINES = [
+    ('pre_game', pre_game_roster),
+    ('first_half', first_half_penalties),
+    ('half_time', half_time_roster_bar),
+    ('overtime', overtime),
+    ('sudden_death', sudden_death),
+    ('game_over', game_over),
+]
+
+def replay(recording):
+    # A timeline playing a recorded game back into a ReplayGameManager, a frame
+    # every 1/fps seconds of the recording, until it ends.
+    def timeline(mgr, frames, fps):
+        for i in range(min(frames, int(recording.duration * fps) + 1)):
+            mgr.seek(i / fps)
+            yield
+    return timeline
+
+def make_manager(tid):
+    mgr = GameManager()
+    mgr.setPassive()
+    mgr.setTid(tid)
+    mgr.setTimeoutState(TimeoutState.none)
+    mgr.setLayout(PoolLayout.white_on_left)
+    return mgr
+
+def wait_for_data(ov, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        ov.render_frame()
+        if ov.has_full_data():
+            return True
+        time.sleep(0.01)
+    return False
+
+def run_case(version, mask, timeline, frames, fps, scores, flag_cache, memory,
+             scale=1.0, assets=None, ready=None, mgr=None):
+    if mgr is None:
+        mgr = make_manager(MOCK_TID)
+    ov = HeadlessOverlay(mgr, mask=MASKS[mask], version=version,
+                         uwhscores=scores, refresh_uwhscores=None,
+                         flag_cache=flag_cache, scale=scale, assets=assets)
+    ov.warm_up()
+    steps = timeline(mgr, frames, fps)
+    next(steps)
+    ov.fetch_uwhscores()
+    wait_for_data(ov)
+    if ready is not None:
+        ready()
+
+    # The luma case pays for splitting out the fill and key too.
+    render = ov.render_fill_key if mask == 'luma' else ov.render_frame
+    latencies = []
+    items = []
+    start = time.perf_counter()
+    cpu = time.process_time()
+    for _ in steps:
+        t = time.perf_counter()
+        render()
+        latencies.append(time.perf_counter() - t)
+        items.append(ov.backend.stats.items)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+
+    peak = None
+    if memory:
+        # tracemalloc slows everything down, so it gets its own short run.
+        tracemalloc.start()
+        for _ in range(10):
+            ov.render_frame()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    # Pixel buffers live outside the Python heap, so also report the process
+    # high-water mark (in KiB on Linux).
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    latencies.sort()
+    return {
+        'frames' : len(latencies),
+        'fps' : len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms' : percentile(latencies, 50) * 1000,
+        'p95_ms' : percentile(latencies, 95) * 1000,
+        'p99_ms' : percentile(latencies, 99) * 1000,
+        'max_ms' : latencies[-1] * 1000 if latencies else 0.0,
+        'cpu_ms' : cpu * 1000 / len(latencies) if latencies else 0.0,
+        'items_mean' : sum(items) / len(items) if items else 0,
+        'items_max' : max(items) if items else 0,
+        'peak_kib' : peak / 1024 if peak is not None else None,
+        'max_rss_mib' : rss / 1024,
+        'warm_up_ms' : ov.startup.warm_up * 1000,
+        'first_frame_ms' : ov.startup.first_frame * 1000,
+        'full_data_ms' : (ov.startup.first_full_frame * 1000
+                          if ov.startup.first_full_frame is not None else None),
+    }
+
+def pool_worker(version, mask, timeline, frames, fps, scale, assets, barrier, results):
+    scores = MockUWHScores(MockTournament(MOCK_TID))
+    with tempfile.TemporaryDirectory() as flag_cache:
+        r = run_case(version, mask, timeline, frames, fps, scores, flag_cache, False,
+                     scale, assets, ready=barrier.wait)
+    results.put(r)
+
+def run_pools(count, version, mask, timeline, frames, fps, scale=1.0):
+    # `count` pools rendering the same timeline at once, one process each, as
+    # the multi-pool host runs them, all sharing one preloaded AssetCache.
+    context = multiprocessing.get_context('fork')
+    assets = AssetCache(scale=scale)
+    assets.preload(startup_assets(version, MASKS[mask], (1920, 1080)))
+    barrier = context.Barrier(count)
+    results = context.Queue()
+    workers = [context.Process(target=pool_worker,
+                               args=(version, mask, timeline, frames, fps, scale, assets,
+                                     barrier, results))
+               for _ in range(count)]
+    for w in workers:
+        w.start()
+    pools = [results.get() for _ in workers]
+    for w in workers:
+        w.join()
+
+    return {
+        'pools' : count,
+        'total_fps' : sum(r['fps'] for r in pools),
+        'fps_min' : min(r['fps'] for r in pools),
+        'p50_ms' : max(r['p50_ms'] for r in pools),
+        'p99_ms' : max(r['p99_ms'] for r in pools),
+        'cpu_ms' : sum(r['cpu_ms'] for r in pools) / count,
+        'max_rss_mib' : max(r['max_rss_mib'] for r in pools),
+        'cpus' : os.cpu_count(),
+    }
+
+def report_pools(results):
+    # Per-pool cost as pools are added: with enough cores the per-pool fps
+    # holds and CPU per frame stays flat.
+    print("%-6s %10s %10s %8s %8s %8s %8s" % (
+        "pools", "total fps", "fps/pool", "p50 ms", "p99 ms", "cpu ms", "rss MiB"))
+    for r in results:
+        print("%-6d %10.1f %10.1f %8.2f %8.2f %8.2f %8.0f" % (
+            r['pools'], r['total_fps'], r['fps_min'], r['p50_ms'], r['p99_ms'],
+            r['cpu_ms'], r['max_rss_mib']))
+    print("(%d CPUs; fps/pool is the slowest pool, latencies the worst)" % (results[0]['cpus'],))
+
+class ItemBackend(RasterBackend):
+    # Draws panels the way they were before shape sprites: shape by shape,
+    # straight onto the frame, without anti-aliasing.
+    def shapes(self, shapes):
+        for kind, bbox, fill, outline, start in shapes:
+            self.items += 1
+            draw_shape(self.draw, kind, self._box(bbox), fill, outline, start)
+
+# One panel of each kind the painter draws, with fractional edges and two tone
+# fills and borders, as (name, painter method, arguments).
+PANELS = [
+    ('round_rectangle', 'round_rectangle',
+     dict(bbox=(40.5, 30, 420, 90.25), radius=30, fill='#2b5c9a',
+          fill_t='#3b6cb0', fill_b='#1e4a80')),
+    ('bordered_round_rectangle', 'bordered_round_rectangle',
+     dict(bbox=(40, 130.5, 520.75, 190), radius=30, outset=3, fill='#000000',
+          border='#ffffff', fill_t='#202020', fill_b='#000000',
+          border_t='#ffffff', border_b='#c0c0c0')),
+    ('bordered_circle', 'bordered_circle',
+     dict(bbox=(600, 30.5, 680.5, 110), outset=3, fill='#ffffff', border='#000000')),
+]
+
+def edge_band(image, radius):
+    # Pixels within `radius` of a change in any channel.
+    size = radius * 2 + 1
+    band = None
+    for channel in image.split():
+        edges = ImageChops.difference(channel.filter(ImageFilter.MaxFilter(size)),
+                                      channel.filter(ImageFilter.MinFilter(size)))
+        band = edges if band is None else ImageChops.lighter(band, edges)
+    return band.point(lambda v: 255 if v else 0)
+
+def check_shapes(ov, scale, radius=2, tolerance=8):
+    # Draw each panel as a sprite and as separate items, and compare. They may
+    # only differ close to an edge, where the sprite is anti-aliased, or else
+    # by a few levels of ringing from the downsampling, and must cover about
+    # the same area.
+    size = (int(round(800 * scale)), int(round(240 * scale)))
+    results = []
+    for name, method, kwargs in PANELS:
+        frames = []
+        for backend in (RasterBackend(size, scale), ItemBackend(size, scale)):
+            ov.backend = backend
+            backend.begin()
+            getattr(ov, method)(**kwargs)
+            frames.append(backend.end())
+        # Compare premultiplied, since colour where there's next to no alpha
+        # never shows.
+        sprite, items = [frame.convert('RGBa') for frame in frames]
+        diff = ImageChops.difference(sprite, items)
+        inside = ImageChops.subtract(max_channel(diff), edge_band(items, radius))
+        worst = inside.getextrema()[1]
+        coverage = [sum(ImageStat.Stat(frame.getchannel('A')).sum) for frame in frames]
+        area = abs(coverage[0] - coverage[1]) / coverage[1]
+        results.append({
+            'panel' : name,
+            'mean_diff' : sum(ImageStat.Stat(diff).mean) / 4,
+            'worst_inside' : worst,
+            'area_diff' : area,
+            'ok' : worst <= tolerance and area <= 0.02,
+        })
+    return results
+
+def max_channel(image):
+    channels = image.split()
+    result = channels[0]
+    for channel in channels[1:]:
+        result = ImageChops.lighter(result, channel)
+    return result
+
+def report_shapes(results):
+    print("%-26s %10s %13s %10s" % ("panel", "mean diff", "worst inside", "area"))
+    for r in results:
+        print("%-26s %10.2f %13d %9.2f%% %s" % (
+            r['panel'], r['mean_diff'], r['worst_inside'], r['area_diff'] * 100,
+            "ok" if r['ok'] else "DIFFERS"))
+
+def case_key(r):
+    return "%s/%s/%s" % (r['version'], r['mask'], r['timeline'])
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def report(results, baseline=None):
+    base = {}
+    if baseline is not None:
+        base = {case_key(r): r for r in baseline['results']}
+
+    print("%-32s %8s %8s %8s %8s %7s %9s %8s%s" % (
+        "case", "fps", "p50 ms", "p95 ms", "p99 ms", "items", "heap KiB",
+        "rss MiB", "   vs base" if base else ""))
+    for r in results:
+        line = "%-32s %8.1f %8.2f %8.2f %8.2f %7d %9s %8.0f" % (
+            case_key(r), r['fps'], r['p50_ms'], r['p95_ms'], r['p99_ms'],
+            r['items_max'],
+            "%.0f" % r['peak_kib'] if r['peak_kib'] is not None else "-",
+            r['max_rss_mib'])
+        b = base.get(case_key(r))
+        if b is not None and b['fps']:
+            line += "   %+6.1f%% fps" % ((r['fps'] / b['fps'] - 1) * 100,)
+        print(line)
+
+    # Only the first case starts cold; later ones find fonts already loaded.
+    if results:
+        r = results[0]
+        print("startup (%s): warm-up %.0f ms, first frame %.0f ms, full data %s" % (
+            case_key(r), r['warm_up_ms'], r['first_frame_ms'],
+            "%.0f ms" % r['full_data_ms'] if r['full_data_ms'] is not None else "never"))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the overlay renderer on scripted game timelines')
+    parser.add_argument('--frames', type=int, default=200,
+                        help='Frames to render per timeline')
+    parser.add_argument('--fps', type=int, default=20,
+                        help='Frames per second of game time, for advancing the clock')
+    parser.add_argument('--version', action='append', dest='versions',
+                        choices=OverlayPainter.versions(),
+                        help='Only run this version (repeatable)')
+    parser.add_argument('--mask', action='append', dest='masks', choices=sorted(MASKS),
+                        help='Only run this mask kind (repeatable)')
+    parser.add_argument('--timeline', action='append', dest='timelines',
+                        choices=[name for name, _ in TIMELINES],
+                        help='Only run this timeline (repeatable)')
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='Render scale, e.g. 0.6667 to draw the 1920x1080 layout at 1280x720')
+    parser.add_argument('--no-memory', action='store_false', dest='memory',
+                        help='Skip the peak memory measurement')
+    parser.add_argument('--standin-latency', type=float, default=None, metavar='MS',
+                        help='Fetch over HTTP from a local stand-in server that '
+                        'delays every response by MS milliseconds')
+    parser.add_argument('--recording', action='append', default=[], metavar='FILE',
+                        help='Also replay this game state recording (see uwh-state-record), '
+                        'a frame every 1/--fps seconds of it, as a timeline (repeatable). '
+                        'UWHScores data comes from the mock, under the recorded tournament id')
+    parser.add_argument('--pools', help='Instead, measure how the multi-pool host scales: render '
+                        'the first selected case in this many pool processes at once, for '
+                        'each count in the comma separated list (e.g. 1,2,4)', default=None)
+    parser.add_argument('--check-shapes', action='store_true',
+                        help='Instead, compare each kind of panel drawn as a sprite '
+                        'against the same panel drawn shape by shape, and exit non-zero '
+                        'if they differ by more than anti-aliasing')
+    parser.add_argument('--json', help='Write the results to this file')
+    parser.add_argument('--compare', help='Compare against results saved with --json')
+    args = parser.parse_args(argv)
+
+    versions = args.versions or OverlayPainter.versions()
+    masks = args.masks or ['none', 'chroma', 'vmac', 'luma']
+    timelines = [(n, t) for n, t in TIMELINES
+                 if args.timelines is None or n in args.timelines]
+
+    if args.check_shapes:
+        ov = HeadlessOverlay(make_manager(MOCK_TID), version=versions[0],
+                             uwhscores=MockUWHScores(MockTournament(MOCK_TID)),
+                             refresh_uwhscores=None, scale=args.scale)
+        results = check_shapes(ov, args.scale)
+        report_shapes(results)
+        if not all(r['ok'] for r in results):
+            raise SystemExit(1)
+        return
+
+    if args.pools is not None:
+        try:
+            counts = [int(n) for n in args.pools.split(',')]
+        except ValueError:
+            parser.error('--pools takes a list of counts, e.g. 1,2,4')
+        name, timeline = timelines[0]
+        results = []
+        for count in counts:
+            r = run_pools(count, versions[0], masks[0], timeline, args.frames, args.fps,
+                          args.scale)
+            r.update(version=versions[0], mask=masks[0], timeline=name)
+            results.append(r)
+        report_pools(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'revision' : git_revision(), 'scale' : args.scale,
+                           'pools' : results}, f, indent=2)
+        return
+
+    recordings = []
+    for path in args.recording:
+        try:
+            recordings.append((path, Recording(path)))
+        except (OSError, ValueError) as e:
+            parser.error("can't replay %s: %s" % (path, e))
+
+    server = None
+    if args.standin_latency is None:
+        scores = MockUWHScores(MockTournament(MOCK_TID))
+    else:
+        server = StandInServer(MockTournament(MOCK_TID),
+                               latency=args.standin_latency / 1000).start()
+        scores = ScoresFetcher(server.url)
+    results = []
+    with tempfile.TemporaryDirectory() as flag_cache:
+        for version in versions:
+            for mask in masks:
+                for name, timeline in timelines:
+                    r = run_case(version, mask, timeline, args.frames, args.fps,
+                                 scores, flag_cache, args.memory, args.scale)
+                    r.update(version=version, mask=mask, timeline=name)
+                    results.append(r)
+                for path, recording in recordings:
+                    mgr = ReplayGameManager(recording, speed=0)
+                    mock = MockUWHScores(MockTournament(mgr.tid() or MOCK_TID))
+                    r = run_case(version, mask, replay(recording), args.frames, args.fps,
+                                 mock, flag_cache, args.memory, args.scale, mgr=mgr)
+                    r.update(version=version, mask=mask,
+                             timeline=os.path.splitext(os.path.basename(path))[0])
+                    results.append(r)
+
+    if server is not None:
+        print("stand-in: %d requests over %d connections, %d deduplicated" % (
+            server.requests, server.connections, scores.deduplicated))
+        scores.close()
+        server.stop()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'revision' : git_revision(), 'scale' : args.scale,
+                       'results' : results}, f, indent=2)
@@ -0,0 +1,162 @@
+import io
+import json
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlsplit
+
+class ScoresFetcher(object):
+    # UWHScores client that never blocks the render thread.
+    #
+    # Requests run on a small thread pool, each worker holding keep-alive
+    # connections that are reused from one request to the next. Identical
+    # requests that are already in flight are folded into one. Callbacks are
+    # queued rather than called from the worker (unless asked for `immediate`);
+    # drain() runs them on whichever thread renders, so they can touch overlay
+    # state without locking. A request that fails, or finds nothing, calls back
+    # with None.
+    def __init__(self, base_url='https://uwhscores.com/api/v1/', workers=2, timeout=10.0):
+        self.base_url = base_url if base_url.endswith('/') else base_url + '/'
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=workers,
+                                        thread_name_prefix='uwhscores')
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._results = queue.Queue()
+
+        self.requests = 0
+        self.deduplicated = 0
+        self.connections = 0
+        self.errors = 0
+
+    def get_tournament(self, tid, callback):
+        self._get('tournaments/%s' % (tid,), 'tournament', callback)
+
+    def get_game_list(self, tid, callback):
+        self._get('tournaments/%s/games' % (tid,), 'games', callback)
+
+    def get_game(self, tid, gid, callback):
+        self._get('tournaments/%s/games/%s' % (tid, gid), 'game', callback)
+
+    def get_roster(self, tid, team_id, callback):
+        def roster(url):
+            return self.fetch_json(url)['team']['roster']
+        self._submit(('roster', tid, team_id),
+                     self._url('tournaments/%s/teams/%s' % (tid, team_id)),
+                     roster, callback)
+
+    def get_team_flag(self, tid, team_id, callback, immediate=False):
+        # With `immediate` the callback runs on the fetching worker as soon as
+        # the flag is in, for callers that wait on it from a thread of their
+        # own rather than from the render thread's drain().
+        def flag(url):
+            team = self.fetch_json(url)['team']
+            if not team.get('flag_url'):
+                return None
+            status, headers, body = self.fetch(urljoin(url, team['flag_url']))
+            if status != 200:
+                raise IOError("HTTP %d fetching flag" % (status,))
+            return io.BytesIO(body)
+        self._submit(('flag', tid, team_id),
+                     self._url('tournaments/%s/teams/%s' % (tid, team_id)),
+                     flag, callback, immediate)
+
+    def drain(self):
+        # Run the callbacks of every request that finished since the last call.
+        # Returns how many were run.
+        delivered = 0
+        while True:
+            try:
+                callbacks, value = self._results.get_nowait()
+            except queue.Empty:
+                return delivered
+            for callback in callbacks:
+                callback(value)
+                delivered += 1
+
+    def close(self):
+        self._pool.shutdown(wait=False)
+
+    def fetch(self, url, headers=None):
+        # Blocking GET over this thread's pooled connection. Returns
+        # (status, headers, body). http.client is imported on first use, on a
+        # worker, rather than holding up startup.
+        import http.client
+        parts = urlsplit(url)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        conn = self._connection(parts.scheme, parts.netloc)
+        for attempt in (0, 1):
+            try:
+                conn.request('GET', path, headers=headers or {})
+                response = conn.getresponse()
+                return response.status, response.headers, response.read()
+            except (http.client.HTTPException, OSError):
+                # The server may have dropped an idle keep-alive connection;
+                # reconnect once before giving up.
+                conn.close()
+                if attempt:
+                    raise
+                with self._lock:
+                    self.connections += 1
+
+    def fetch_json(self, url, headers=None):
+        status, _, body = self.fetch(url, headers)
+        if status != 200:
+            raise IOError("HTTP %d fetching %s" % (status, url))
+        return json.loads(body.decode('utf-8'))
+
+    def _url(self, path):
+        return urljoin(self.base_url, path)
+
+    def _connection(self, scheme, netloc):
+        conns = getattr(self._local, 'conns', None)
+        if conns is None:
+            conns = self._local.conns = {}
+        conn = conns.get((scheme, netloc))
+        if conn is None:
+            import http.client
+            if scheme == 'https':
+                conn = http.client.HTTPSConnection(netloc, timeout=self.timeout)
+            else:
+                conn = http.client.HTTPConnection(netloc, timeout=self.timeout)
+            conns[(scheme, netloc)] = conn
+            with self._lock:
+                self.connections += 1
+        return conn
+
+    def _get(self, path, field, callback):
+        def get(url):
+            return self.fetch_json(url)[field]
+        url = self._url(path)
+        self._submit(url, url, get, callback)
+
+    def _submit(self, key, url, work, callback, immediate=False):
+        with self._lock:
+            waiting = self._inflight.get(key)
+            if waiting is not None:
+                waiting.append((callback, immediate))
+                self.deduplicated += 1
+                return
+            self._inflight[key] = [(callback, immediate)]
+            self.requests += 1
+        self._pool.submit(self._run, key, url, work)
+
+    def _run(self, key, url, work):
+        try:
+            value = work(url)
+        except Exception as e:
+            print("UWHScores request for %s failed: %s" % (url, e))
+            value = None
+            with self._lock:
+                self.errors += 1
+        with self._lock:
+            callbacks = self._inflight.pop(key)
+        # Callbacks always hear back, with None when there's nothing, so
+        # anything waiting on one isn't left hanging by a failed request.
+        for callback, immediate in callbacks:
+            if immediate:
+                callback(value)
+        queued = [callback for callback, immediate in callbacks if not immediate]
+        if queued:
+            self._results.put((queued, value))
@@ -0,0 +1,147 @@
+import os
+import queue
+import threading
+import time
+from PIL import Image
+from overlay.assets import Asset
+
+def default_cache_dir():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'uwh-overlay', 'flags')
+
+class FlagPipeline(object):
+    # Team flags, decoded and scaled to every size the overlay draws them at.
+    #
+    # All image work happens on a worker thread, which also keeps the scaled
+    # thumbnails on disk so a restart (or a team coming back later in the
+    # tournament) never has to fetch or resample them again. The render thread
+    # only ever looks up finished variants.
+    #
+    # `sizes` are in layout units, like AssetCache's; the images themselves are
+    # `scale` times that.
+    #
+    # A team without a flag, or whose flag couldn't be had, isn't asked for
+    # again for `retry` seconds, doubling each time it still isn't there, up
+    # to `max_retry`.
+    def __init__(self, uwhscores, sizes, cache_dir=None, photos=True,
+                 fetch_timeout=15, scale=1.0, retry=30.0, max_retry=600.0):
+        self.uwhscores = uwhscores
+        self.sizes = tuple((int(w), int(h)) for w, h in sizes)
+        self.render_scale = scale
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.photos = photos
+        self.fetch_timeout = fetch_timeout
+        self.retry = retry
+        self.max_retry = max_retry
+
+        self._flags = {}
+        # (tid, team_id) -> (when to ask again, how long the wait was)
+        self._missing = {}
+        self._pending = set()
+        self._requests = queue.Queue()
+        self._ready = queue.Queue()
+
+        self._worker = threading.Thread(target=self._work, name='flags', daemon=True)
+        self._worker.start()
+
+    def request(self, tid, team_id):
+        key = (tid, team_id)
+        if team_id is None or key in self._flags or key in self._pending:
+            return
+        missing = self._missing.get(key)
+        if missing is not None and time.monotonic() < missing[0]:
+            return
+        self._pending.add(key)
+        self._requests.put(key)
+
+    def get(self, tid, team_id, size):
+        variants = self._flags.get((tid, team_id))
+        if variants is None:
+            return None
+        return variants.get((int(size[0]), int(size[1])))
+
+    def drain(self):
+        # Called from the render thread: adopt whatever the worker finished
+        # since the last frame. Returns whether anything new arrived.
+        arrived = False
+        while True:
+            try:
+                key, variants = self._ready.get_nowait()
+            except queue.Empty:
+                return arrived
+            self._pending.discard(key)
+            if variants is None:
+                missing = self._missing.get(key)
+                wait = self.retry if missing is None else min(missing[1] * 2, self.max_retry)
+                self._missing[key] = (time.monotonic() + wait, wait)
+                continue
+            self._missing.pop(key, None)
+            if self.photos:
+                for asset in variants.values():
+                    asset.photo
+            self._flags[key] = variants
+            arrived = True
+
+    def pixel_size(self, size):
+        return (max(1, int(size[0] * self.render_scale)), max(1, int(size[1] * self.render_scale)))
+
+    def thumbnail_path(self, tid, team_id, size):
+        size = self.pixel_size(size)
+        return os.path.join(self.cache_dir, str(tid),
+                            "%s-%dx%d.png" % (team_id, size[0], size[1]))
+
+    def _work(self):
+        while True:
+            tid, team_id = self._requests.get()
+            try:
+                variants = self._load(tid, team_id)
+                if variants is None:
+                    variants = self._fetch(tid, team_id)
+            except Exception as e:
+                print("Flag for team %s unavailable: %s" % (team_id, e))
+                variants = None
+            self._ready.put(((tid, team_id), variants))
+
+    def _load(self, tid, team_id):
+        variants = {}
+        for size in self.sizes:
+            path = self.thumbnail_path(tid, team_id, size)
+            if not os.path.exists(path):
+                return None
+            image = Image.open(path)
+            image.load()
+            variants[size] = Asset(image)
+        return variants
+
+    def _fetch(self, tid, team_id):
+        # The answer comes straight to this thread, not by way of the render
+        # thread's drain(), so a slow frame doesn't hold flags up. It's None
+        # when the team has no flag or the request failed.
+        answer = queue.Queue()
+        self.uwhscores.get_team_flag(tid, team_id, answer.put, immediate=True)
+        try:
+            flag = answer.get(timeout=self.fetch_timeout)
+        except queue.Empty:
+            return None
+        if flag is None:
+            return None
+
+        source = Image.open(flag)
+        source.load()
+        return self.scale(tid, team_id, source)
+
+    def scale(self, tid, team_id, source):
+        if source.mode not in ('RGB', 'RGBA'):
+            source = source.convert('RGBA')
+        variants = {}
+        os.makedirs(os.path.join(self.cache_dir, str(tid)), exist_ok=True)
+        for size in self.sizes:
+            image = source.resize(self.pixel_size(size), Image.LANCZOS)
+            path = self.thumbnail_path(tid, team_id, size)
+            # Write-then-rename so a crash never leaves a half-written PNG
+            # behind for the next start to trip over. Pools on one host share
+            # the cache, so each writer gets a temporary file of its own.
+            tmp = '%s.%d-%d.tmp' % (path, os.getpid(), threading.get_ident())
+            image.save(tmp, 'PNG')
+            os.replace(tmp, path)
+            variants[size] = Asset(image)
+        return variants
@@ -0,0 +1,88 @@
+def abbreviate(s, max_len=16):
+    if len(s) > max_len:
+        return s[0:max_len-3] + "..."
+    else:
+        return s
+
+class Player(object):
+    __slots__ = ('number', 'name', 'short_name', 'roster_text')
+
+    def __init__(self, number, name):
+        self.number = number
+        self.name = name
+        # As drawn beside goals and penalties, and in the pre-game roster.
+        self.short_name = abbreviate(name, 28) if name is not None else None
+        self.roster_text = "#{} - {}".format(number, abbreviate(name or "", 26))
+
+class Roster(object):
+    # A team roster as UWHScores returned it, indexed by cap number and
+    # sorted for display once, when the response arrives.
+    __slots__ = ('response', 'players', 'by_number')
+
+    def __init__(self, response):
+        self.response = response
+        players = [Player(p['number'], p['name']) for p in response]
+        self.by_number = {}
+        for player in players:
+            self.by_number.setdefault(player.number, player)
+        self.players = sorted(players, key=lambda p: p.number)
+
+    def __iter__(self):
+        return iter(self.players)
+
+    def __len__(self):
+        return len(self.players)
+
+    def short_name(self, number):
+        player = self.by_number.get(number)
+        return player.short_name if player is not None else None
+
+class GameData(object):
+    # What UWHScores knows about one game: the game itself, its tournament
+    # and both teams' names, ids and rosters. Responses fill it in as they
+    # arrive. The painter draws from exactly one of these at a time, so a
+    # bundle prepared ahead of time can be switched in whole.
+    __slots__ = ('tid', 'gid', 'game', 'tournament',
+                 'black_id', 'white_id', 'black_name', 'white_name',
+                 'black_roster', 'white_roster')
+
+    def __init__(self, tid=None, gid=None):
+        self.tid = tid
+        self.gid = gid
+        self.game = None
+        self.tournament = None
+        self.black_id = None
+        self.white_id = None
+        self.black_name = "Black"
+        self.white_name = "White"
+        self.black_roster = None
+        self.white_roster = None
+
+    def set_roster(self, color, response):
+        # Returns whether the roster changed. An unchanged response keeps the
+        # Roster already built from it.
+        attr = color + '_roster'
+        roster = getattr(self, attr)
+        if roster is not None and roster.response == response:
+            return False
+        setattr(self, attr, Roster(response))
+        return True
+
+    def matches(self, tid, gid):
+        return self.tid == tid and self.gid == gid
+
+    def complete(self):
+        return (self.game is not None and self.tournament is not None and
+                self.black_roster is not None and self.white_roster is not None)
+
+def next_gid(game, schedule):
+    # The game that follows `game` in its pool, going by the tournament's
+    # schedule, or simply the next gid when there's no schedule to go on.
+    if schedule and game.get('start_time') is not None:
+        later = [g for g in schedule
+                 if g.get('pool') == game.get('pool') and
+                    g.get('start_time') is not None and
+                    (g['start_time'], g['gid']) > (game['start_time'], game['gid'])]
+        if later:
+            return min(later, key=lambda g: (g['start_time'], g['gid']))['gid']
+    return game['gid'] + 1
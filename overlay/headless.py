@@ -0,0 +1,69 @@
+import time
+from overlay.backend import RasterBackend, fill_and_key
+from overlay.painter import OverlayPainter, MaskKind
+from overlay.scheduler import FrameScheduler
+
+class HeadlessOverlay(OverlayPainter):
+    # The overlay without Tk: every call to render_frame() returns the current
+    # frame as an RGBA PIL image, `scale` times the layout `size`.
+    def __init__(self, mgr, mask=MaskKind.NONE, version=None, size=(1920, 1080),
+                 uwhscores=None, refresh_uwhscores=5.0, profiler=None,
+                 flag_cache=None, scale=1.0, assets=None, started=None):
+        pixels = (int(round(size[0] * scale)), int(round(size[1] * scale)))
+        OverlayPainter.__init__(self, size, mgr, mask, version, False,
+                                RasterBackend(pixels, scale), uwhscores=uwhscores,
+                                photos=False, profiler=profiler,
+                                flag_cache=flag_cache, assets=assets, started=started)
+        self.refresh_uwhscores = refresh_uwhscores
+        self._last_fetch = None
+        self.scheduler = None
+
+    def refresh(self):
+        now = time.monotonic()
+        if (self.refresh_uwhscores is not None and
+            (self._last_fetch is None or
+             now - self._last_fetch >= self.refresh_uwhscores)):
+            self._last_fetch = now
+            self.fetch_uwhscores()
+
+    def render_frame(self):
+        self.refresh()
+        self.poll()
+        frame = self.paint()
+        self.profiler.frame_done()
+        self.frame_shown()
+        return frame
+
+    def render_fill_key(self):
+        # With MaskKind.LUMA: one render, split into a fill / key pair.
+        return fill_and_key(self.render_frame())
+
+    def run(self, publish, min_interval=50, max_interval=1000):
+        # Same pacing as the Tk window: check every min_interval ms, and hand
+        # publish() a new frame whenever something changed, or at least every
+        # max_interval ms. With MaskKind.LUMA it gets (fill, key) pairs.
+        last_paint = None
+        self.scheduler = FrameScheduler(min_interval / 1000)
+        self.profiler.attach(self.scheduler)
+        while True:
+            self.profiler.record('lateness', self.scheduler.tick())
+            self.refresh()
+            self.poll()
+            now = time.monotonic()
+            if (self.stale() or last_paint is None or
+                (now - last_paint) * 1000 >= max_interval):
+                last_paint = now
+                frame = self.paint()
+                if self.mask == MaskKind.LUMA:
+                    frame = fill_and_key(frame)
+                publish(frame)
+                self.profiler.frame_done()
+                self.frame_shown()
+            time.sleep(self.scheduler.delay())
+
+    def render_bytes(self):
+        return self.render_frame().tobytes()
+
+    def render_array(self):
+        import numpy
+        return numpy.asarray(self.render_frame())
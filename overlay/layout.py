@@ -0,0 +1,219 @@
+# Where everything goes, for each --version of the overlay.
+#
+# A version is a handful of declarative choices on top of DEFAULTS: where the
+# status bar sits, whether the game clock block is split off to the far side,
+# and whether the 2018 Worlds branding is shown. compile_layout() turns one
+# into absolute coordinates for an output size, once; the views only look
+# coordinates up.
+
+DEFAULTS = {
+    # Status bar: team names and scores, game state, clock, timeouts
+    'margin' : 40,
+    'top' : 40,
+    'radius' : 10,
+    'score_radius' : 0,
+    'outset' : 3,
+    'height' : 30,
+    'bar_width' : 350,
+    'score_width' : 50,
+    'flag_width' : 60,
+    'state_width' : 110,
+    'time_width' : 155,
+    'timeout_l_width' : 150,
+    'timeout_r_width' : 110,
+    'sticker_size' : 130,
+
+    # Goals and penalties, stacked under the status bar
+    'player_width' : 450,
+    'unnamed_width' : 120,
+    'goal_height' : 50,
+    'penalty_height' : 30,
+    'v_spacing' : 15,
+
+    # Roster / results view
+    'roster_flag_size' : (150, 100),
+    'roster_bar_height' : 100,
+    'game_bar' : (1600, 250, 525),        # bar width, title width, column spread
+    'tournament_bar' : (1200, 450, 450),
+    'pre_game_bar_y' : 100,
+    'results_bar_y' : 725,
+    'half_time_bar_y' : 900,
+    'roster_y' : 250,
+    'player_height' : 40,
+    'player_pitch' : 60,
+    'score_y' : 500,
+    'score_circle' : 300,
+    'logo_y' : 550,
+    'next_size' : (200, 50),
+
+    'align' : 'left',       # status bar against the left edge, or 'center'
+    'split' : False,        # clock block against the right edge
+    'branding' : False,     # Worlds 2018 sticker and logo; every version
+                            # shows the GoFundMe panel at half time
+}
+
+LAYOUTS = {
+    'center' : dict(DEFAULTS, align='center'),
+    'split' : dict(DEFAULTS, split=True),
+    'worlds' : dict(DEFAULTS, branding=True),
+    'left' : dict(DEFAULTS),
+}
+
+# What the overlay looked like before --version did anything.
+DEFAULT_VERSION = 'worlds'
+
+class StatusLayout(object):
+    def __init__(self, d, w, h):
+        outset = d['outset']
+        height = d['height']
+        bar_width = d['bar_width']
+        score_width = d['score_width']
+        state_width = d['state_width']
+        time_width = d['time_width']
+        timeout_l_width = d['timeout_l_width']
+        timeout_r_width = d['timeout_r_width']
+        score_offset = bar_width - score_width
+        clock_width = state_width + time_width + timeout_l_width
+
+        self.radius = d['radius']
+        self.score_radius = d['score_radius']
+        self.outset = outset
+
+        if d['align'] == 'center':
+            x1 = (w - bar_width - clock_width) / 2
+        else:
+            x1 = d['margin'] + outset
+        y1 = d['top']
+        y2 = y1 + height * 2 + outset * 2
+        if d['split']:
+            cx = w - d['margin'] - outset - clock_width - timeout_r_width
+        else:
+            cx = x1 + bar_width
+
+        self.team_box = (x1, y1, x1 + bar_width, y2)
+        self.state_box = (cx, y1, cx + state_width, y2)
+        self.time_box = (cx + state_width, y1, cx + state_width + time_width, y2)
+        tx = cx + state_width + time_width
+        self.timeout_box = (tx, y1, tx + timeout_l_width, y2)
+        self.team_timeout_box = (tx, y1, tx + timeout_l_width + timeout_r_width, y2)
+
+        self.flag_size = (d['flag_width'], height + outset)
+        self.top_flag = (x1 + bar_width - score_width, y1)
+        self.bottom_flag = (x1 + bar_width - score_width, y1 + height + outset)
+        self.top_score_box = (x1 + score_offset, y1,
+                              x1 + score_offset + score_width, y1 + height + outset)
+        self.bottom_score_box = (x1 + score_offset, y1 + height + outset,
+                                 x1 + score_offset + score_width, y2)
+        self.top_score = (x1 + score_offset + score_width / 2 + 3, y1 + height / 2 + outset)
+        self.bottom_score = (x1 + score_offset + score_width / 2 + 3,
+                             y1 + height / 2 + height + outset * 2)
+        self.top_name = (x1 + 10, y1 + outset + height / 2)
+        self.bottom_name = (x1 + 10, y1 + height + outset * 2 + height / 2)
+
+        self.timeout_text = (tx + 30, y1 + height + outset * 2)
+        self.timeout_clock = (tx + timeout_l_width + timeout_r_width - 15, y1 + height + outset * 2)
+        self.state_text = (cx + outset + 25, y1 + height + outset)
+        self.time_text = (cx + state_width + time_width / 2, y1 + height + outset * 3)
+
+        self.sticker = None
+        if d['branding']:
+            self.sticker = ((w - (d['margin'] + outset) + 30, y1),
+                            (d['sticker_size'], d['sticker_size']))
+
+        # Goals and penalties: boxes start at list_x, list_y and stack down.
+        self.list_x = x1
+        self.list_y = y1 + height * 3
+        self.player_width = d['player_width']
+        self.unnamed_width = d['unnamed_width']
+        self.goal_height = d['goal_height']
+        self.penalty_height = d['penalty_height']
+        self.v_spacing = d['v_spacing']
+
+class RosterLayout(object):
+    def __init__(self, d, w, h, bar, bar_y, rows=16):
+        bar_width, title_width, col_spread = bar
+        flag_width, bar_height = d['roster_flag_size']
+        radius = d['radius']
+        outset = d['outset']
+        center_x = w / 2
+        col_width = (bar_width - title_width - flag_width * 2) / 2
+        bar_bottom = bar_y + bar_height
+
+        self.radius = radius
+        self.outset = outset
+        self.flag_size = d['roster_flag_size']
+        self.bar_box = (center_x - bar_width / 2, bar_y, center_x + bar_width / 2, bar_bottom)
+        self.left_flag = (center_x - title_width / 2, bar_y)
+        self.right_flag = (center_x + title_width / 2, bar_y)
+        self.left_team_box = (center_x - bar_width / 2, bar_y,
+                              center_x - title_width / 2 - flag_width, bar_bottom)
+        self.right_team_box = (center_x + title_width / 2 + flag_width, bar_y,
+                               center_x + bar_width / 2, bar_bottom)
+        self.title_box = (center_x - title_width / 2, bar_y,
+                          center_x + title_width / 2, bar_bottom)
+        self.left_name = (center_x - bar_width / 2 + col_width / 2, bar_y + bar_height / 2)
+        self.right_name = (center_x + bar_width / 2 - col_width / 2, bar_y + bar_height / 2)
+        self.title_lines = ((center_x, bar_y + bar_height / 4 - 5),
+                            (center_x, bar_y + bar_height / 2),
+                            (center_x, bar_y + 3 * bar_height / 4 + 5))
+
+        # One (box, text position) per roster row, for each column.
+        left_col = center_x - col_spread
+        right_col = center_x + col_spread
+        self.left_rows = []
+        self.right_rows = []
+        for i in range(rows):
+            y = d['roster_y'] + d['player_pitch'] * i
+            self.left_rows.append(((left_col - col_width / 2 - radius, y,
+                                    left_col + col_width / 2 - radius, y + d['player_height']),
+                                   (left_col - col_width / 2, y + d['player_height'] / 2)))
+            self.right_rows.append(((right_col - col_width / 2 + radius, y,
+                                     right_col + col_width / 2 + radius, y + d['player_height']),
+                                    (right_col - col_width / 2 + radius * 2, y + d['player_height'] / 2)))
+
+        r = d['score_circle'] / 2
+        score_y = d['score_y']
+        self.left_score_box = (left_col - r, score_y - r, left_col + r, score_y + r)
+        self.right_score_box = (right_col - r, score_y - r, right_col + r, score_y + r)
+        self.left_score = (left_col, score_y + 20)
+        self.right_score = (right_col, score_y + 20)
+
+        self.logo = None
+        self.results_logo = None
+        if d['branding']:
+            scale = 400 / 1500
+            self.logo = ((center_x, d['logo_y']), (int(1500 * scale), int(900 * scale)))
+            self.results_logo = ((center_x, score_y), (int(1500 * scale), int(900 * scale)))
+        self.navisjon = ((w / 2, h - 150), (400, 100))
+
+        next_w, next_h = d['next_size']
+        next_y = h - 50
+        self.next_box = (center_x - next_w / 2, next_y - next_h / 2,
+                         center_x + next_w / 2, next_y + next_h / 2)
+        self.next_text = (center_x - next_w / 2 + 20, next_y)
+
+class Layout(object):
+    def __init__(self, version, w, h):
+        d = LAYOUTS[version]
+        self.version = version
+        self.status = StatusLayout(d, w, h)
+
+        # Keyed by (whether the game is known, which view the bar is in).
+        self.rosters = {}
+        for has_game, bar in ((True, d['game_bar']), (False, d['tournament_bar'])):
+            for view in ('pre_game', 'results', 'half_time'):
+                self.rosters[(has_game, view)] = RosterLayout(d, w, h, bar,
+                                                              d[view + '_bar_y'])
+
+        # Every size a team flag is drawn at: the status bar and the roster bar.
+        self.flag_sizes = (self.status.flag_size, d['roster_flag_size'])
+
+_compiled = {}
+
+def compile_layout(version, w, h):
+    version = version or DEFAULT_VERSION
+    key = (version, w, h)
+    layout = _compiled.get(key)
+    if layout is None:
+        layout = _compiled[key] = Layout(version, w, h)
+    return layout
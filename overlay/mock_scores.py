@@ -0,0 +1,236 @@
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A stand-in for uwhscores.com, for benchmarks and for running without a
+# network. It serves a made-up tournament shaped like the 2018 Worlds (tid 17):
+# 272 games between the national teams we have scoreboard flags for.
+
+FLAG_DIR = 'res/scoreboard/flags/white'
+
+COUNTRIES = [
+    "Argentina", "Australia", "Belgium", "Canada", "Colombia", "France",
+    "Great Britain", "Japan", "Netherlands", "New Zealand", "Portugal",
+    "South Africa", "Spain", "Turkey", "USA",
+]
+
+FIRST_NAMES = [
+    "Alex", "Sam", "Jordan", "Casey", "Robin", "Charlie", "Jamie", "Morgan",
+    "Taylor", "Quinn", "Avery", "Riley", "Harper", "Rowan", "Emerson",
+]
+
+LAST_NAMES = [
+    "Vanderbilt-Oosterhuis", "Smith", "Nakamura", "Okonkwo", "Fernandes",
+    "Dubois", "O'Sullivan", "MacAllister", "Kowalczyk", "Haddad", "Lindqvist",
+    "Papadopoulos", "Rasmussen", "Delacroix-Montgomery", "Ng",
+]
+
+class MockTournament(object):
+    def __init__(self, tid=17, games=272, roster_size=12,
+                 start=datetime(2018, 7, 20, 8, 0, 0)):
+        self.tid = tid
+        self.teams = {}
+        for team_id, country in enumerate(COUNTRIES, 1):
+            roster = []
+            for number in range(1, roster_size + 1):
+                roster.append({
+                    'number' : (number * 7) % 99 + 1,
+                    'name' : "%s %s" % (FIRST_NAMES[(team_id + number) % len(FIRST_NAMES)],
+                                        LAST_NAMES[(team_id * number) % len(LAST_NAMES)]),
+                    'player_id' : team_id * 100 + number,
+                })
+            self.teams[team_id] = {
+                'team_id' : team_id,
+                'name' : country,
+                'roster' : roster,
+                'flag' : os.path.join(FLAG_DIR, country + '.png'),
+            }
+
+        self.games = {}
+        team_ids = sorted(self.teams)
+        for gid in range(1, games + 1):
+            black = team_ids[gid % len(team_ids)]
+            white = team_ids[(gid * 5 + 3) % len(team_ids)]
+            if white == black:
+                white = team_ids[(gid + 1) % len(team_ids)]
+            pool = (gid - 1) % 4 + 1
+            when = start + timedelta(minutes=40 * ((gid - 1) // 4))
+            self.games[gid] = {
+                'gid' : gid,
+                'tid' : tid,
+                'black' : self.teams[black]['name'] + " (Men)",
+                'white' : self.teams[white]['name'] + " (Men)",
+                'black_id' : black,
+                'white_id' : white,
+                'game_type' : 'RR' if gid < 200 else 'BR',
+                'description' : None if gid < 200 else "Playoff %d" % (gid - 199,),
+                'pool' : str(pool),
+                'start_time' : when.strftime("%Y-%m-%dT%H:%M:%S"),
+                'score_b' : None,
+                'score_w' : None,
+            }
+
+        self.tournament = {
+            'tid' : tid,
+            'name' : "Mock Underwater Hockey Championships",
+            'location' : "Nowhere, QC",
+            'start_date' : start.strftime("%Y-%m-%d"),
+        }
+
+    def flag_bytes(self, team_id):
+        with open(self.teams[team_id]['flag'], 'rb') as f:
+            return f.read()
+
+class MockUWHScores(object):
+    # Same interface as uwh.uwhscores_comms.UWHScores, answering synchronously
+    # from a MockTournament, with None for anything it doesn't have.
+    def __init__(self, tournament=None):
+        self.data = tournament or MockTournament()
+        self.requests = 0
+
+    def get_tournament(self, tid, callback):
+        self.requests += 1
+        callback(dict(self.data.tournament) if tid == self.data.tid else None)
+
+    def get_game_list(self, tid, callback):
+        self.requests += 1
+        callback([dict(g) for g in self.data.games.values()] if tid == self.data.tid else None)
+
+    def get_game(self, tid, gid, callback):
+        self.requests += 1
+        if tid == self.data.tid and gid in self.data.games:
+            callback(dict(self.data.games[gid]))
+        else:
+            callback(None)
+
+    def get_roster(self, tid, team_id, callback):
+        self.requests += 1
+        if tid == self.data.tid and team_id in self.data.teams:
+            callback([dict(p) for p in self.data.teams[team_id]['roster']])
+        else:
+            callback(None)
+
+    def get_team_flag(self, tid, team_id, callback, immediate=False):
+        self.requests += 1
+        if tid == self.data.tid and team_id in self.data.teams:
+            callback(io.BytesIO(self.data.flag_bytes(team_id)))
+        else:
+            callback(None)
+
+    def drain(self):
+        # Everything above already answered synchronously.
+        return 0
+
+class StandInServer(object):
+    # Serves a MockTournament over HTTP in the shape of the uwhscores.com v1
+    # API, sleeping `latency` seconds before every response. Answers
+    # If-None-Match with 304s. Counts requests and TCP connections, so
+    # keep-alive reuse can be checked from outside.
+    def __init__(self, tournament=None, latency=0.0, host='127.0.0.1', port=0):
+        self.data = tournament or MockTournament()
+        self.latency = latency
+        self.requests = 0
+        self.not_modified = 0
+        self.connections = 0
+
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                server.connections += 1
+
+            def do_GET(self):
+                server.requests += 1
+                if server.latency:
+                    time.sleep(server.latency)
+                status, content_type, body = server.route(self.path)
+                etag = '"%s"' % (hashlib.sha1(body).hexdigest(),)
+                if status == 200 and self.headers.get('If-None-Match') == etag:
+                    server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = 'http://%s:%d/api/v1/' % self.httpd.server_address[:2]
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever,
+                                        name='standin', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def route(self, path):
+        parts = [p for p in path.split('?')[0].split('/') if p]
+        data = self.data
+
+        if parts[:1] == ['flags'] and len(parts) == 3:
+            team_id = int(parts[2].split('.')[0])
+            if int(parts[1]) == data.tid and team_id in data.teams:
+                return 200, 'image/png', data.flag_bytes(team_id)
+            return self._json(404, {'error' : 'no such flag'})
+
+        if parts[:3] != ['api', 'v1', 'tournaments'] or len(parts) < 4:
+            return self._json(404, {'error' : 'not found'})
+        if int(parts[3]) != data.tid:
+            return self._json(404, {'error' : 'no such tournament'})
+
+        rest = parts[4:]
+        if not rest:
+            return self._json(200, {'tournament' : data.tournament})
+        if rest == ['games']:
+            return self._json(200, {'games' : list(data.games.values())})
+        if rest[0] == 'games' and len(rest) == 2 and int(rest[1]) in data.games:
+            return self._json(200, {'game' : data.games[int(rest[1])]})
+        if rest[0] == 'teams' and len(rest) == 2 and int(rest[1]) in data.teams:
+            team = data.teams[int(rest[1])]
+            return self._json(200, {'team' : {
+                'team_id' : team['team_id'],
+                'name' : team['name'],
+                'roster' : team['roster'],
+                'flag_url' : '/flags/%d/%d.png' % (data.tid, team['team_id']),
+            }})
+        return self._json(404, {'error' : 'not found'})
+
+    @staticmethod
+    def _json(status, value):
+        return status, 'application/json', json.dumps(value).encode('utf-8')
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Local stand-in for the uwhscores.com API')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds to wait before answering each request')
+    args = parser.parse_args(argv)
+
+    server = StandInServer(latency=args.latency, host='0.0.0.0', port=args.port)
+    print("Serving a mock tournament at http://<this host>:%d/api/v1/" % (args.port,))
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.httpd.server_close()
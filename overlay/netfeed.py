@@ -0,0 +1,485 @@
+import ipaddress
+import os
+import random
+import socket
+import struct
+import threading
+import time
+from uwh.gamemanager import GameManager, TeamColor
+from overlay.profiler import percentile
+from overlay.scheduler import FrameScheduler
+from overlay.sharedstate import (ReadOnlyGameManager, SharedPenalty, SharedGoal, PENALTY, GOAL,
+                                 MAX_PENALTIES, NONE_ID, StatePublisher, start_listener)
+
+# GameManager state over the network, for running the overlay away from the
+# timekeeper's serial bus.
+#
+# Every datagram starts with a 32 byte header:
+#
+#   0   4s  magic, b'UWHF'
+#   4   B   version, 1
+#   5   B   kind: FULL or DELTA
+#   6   H   number of fields that follow
+#   8   I   session, picked at random each time a sender starts
+#   12  I   sequence number within the session
+#   16  I   sequence number of the FULL packet a DELTA is relative to
+#   20  4x
+#   24  d   time.time() on the sender when the state was read
+#
+# followed by fields, each a one byte id and its value. A FULL packet has all
+# of them and goes out at least every `keyframe` seconds; in between, each
+# DELTA carries every field that differs from the last FULL one, not just
+# from the previous DELTA, so a lost DELTA costs nothing as long as the next
+# one arrives. A lost FULL packet does: the DELTAs after it are relative to
+# a FULL the receiver never got, so it drops them and holds its last state
+# until the next FULL. Receivers can't ask for one, as the feed may be
+# multicast and one way, so FULL packets (at most one Ethernet frame) go out
+# every KEYFRAME seconds by default to keep that short. Receivers drop
+# anything not newer than what they applied last.
+#
+# Times compare wall clocks, so latencies measured across machines are only as
+# good as their clock sync.
+
+MAGIC = b'UWHF'
+VERSION = 1
+FULL = 0
+DELTA = 1
+
+HEADER = struct.Struct('<4sBBHIII4xd')
+
+# Field ids, in the order of ReadOnlyGameManager's state.
+GAME_STATE, TIMEOUT_STATE, GAME_CLOCK, CLOCK_AT_PAUSE, BLACK_SCORE, WHITE_SCORE, \
+    LAYOUT, TID, GID, PENALTIES, GOALS = range(11)
+
+SCALARS = [struct.Struct(f) for f in ('<i', '<i', '<q', '<q', '<i', '<i', '<i', '<q', '<q')]
+COUNT = struct.Struct('<H')
+GOAL_TOTAL = struct.Struct('<IH')
+
+# Few enough goals that a FULL packet still fits one Ethernet frame; the
+# overlay only ever shows the latest.
+MAX_GOALS = 16
+
+EMPTY = [0, 0, 0, 0, 0, 0, 0, NONE_ID, NONE_ID, (), (0, ())]
+
+DEFAULT_ADDRESS = 'udp://239.255.84.70:5840'
+
+# Default seconds between FULL packets, which is also the longest a lost one
+# can freeze a receiver for.
+KEYFRAME = 0.25
+
+def parse_address(text):
+    # udp://HOST:PORT, multicast when HOST is a group address, or unix:///PATH
+    # for a datagram socket on this machine.
+    if text.startswith('unix://'):
+        return socket.AF_UNIX, text[len('unix://'):]
+    if text.startswith('udp://'):
+        host, sep, port = text[len('udp://'):].rpartition(':')
+        if sep and host and port.isdigit():
+            return socket.AF_INET, (host, int(port))
+    raise ValueError("expected udp://HOST:PORT or unix:///PATH, not %r" % (text,))
+
+def is_multicast(address):
+    try:
+        return ipaddress.ip_address(address[0]).is_multicast
+    except ValueError:
+        return False
+
+def read_fields(mgr):
+    penalties = mgr.penalties(TeamColor.white) + mgr.penalties(TeamColor.black)
+    goals = mgr.goals()
+    return [mgr.gameState(), mgr.timeoutState(),
+            int(mgr.gameClock()), int(mgr.gameClockAtPause()),
+            mgr.blackScore(), mgr.whiteScore(), mgr.layout(),
+            NONE_ID if mgr.tid() is None else mgr.tid(),
+            NONE_ID if mgr.gid() is None else mgr.gid(),
+            tuple((p.player(), p.team(), bool(p.dismissed()), int(p.timeRemaining(mgr)),
+                   bool(p.servedCompletely(mgr))) for p in penalties[:MAX_PENALTIES]),
+            (len(goals), tuple((g.goal_no(), g.player(), g.team(), int(g.time()), g.state())
+                               for g in goals[-MAX_GOALS:]))]
+
+def encode_field(field, value):
+    if field == PENALTIES:
+        return (bytes((field,)) + COUNT.pack(len(value)) +
+                b''.join(PENALTY.pack(*p) for p in value))
+    if field == GOALS:
+        total, goals = value
+        return (bytes((field,)) + GOAL_TOTAL.pack(total, len(goals)) +
+                b''.join(GOAL.pack(*g) for g in goals))
+    return bytes((field,)) + SCALARS[field].pack(value)
+
+def decode_field(data, offset, values):
+    # Decodes one field into `values`, returning the offset after it.
+    field = data[offset]
+    offset += 1
+    if field == PENALTIES:
+        count, = COUNT.unpack_from(data, offset)
+        offset += COUNT.size
+        values[field] = tuple(PENALTY.unpack_from(data, offset + i * PENALTY.size)
+                              for i in range(count))
+        return offset + count * PENALTY.size
+    if field == GOALS:
+        total, count = GOAL_TOTAL.unpack_from(data, offset)
+        offset += GOAL_TOTAL.size
+        values[field] = (total, tuple(GOAL.unpack_from(data, offset + i * GOAL.size)
+                                      for i in range(count)))
+        return offset + count * GOAL.size
+    values[field], = SCALARS[field].unpack_from(data, offset)
+    return offset + SCALARS[field].size
+
+def open_sender(address, ttl=1):
+    family, target = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    if family == socket.AF_INET and is_multicast(target):
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, ttl)
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_LOOP, 1)
+    return sock, target
+
+def open_receiver(address):
+    family, target = parse_address(address)
+    sock = socket.socket(family, socket.SOCK_DGRAM)
+    if family == socket.AF_UNIX:
+        try:
+            os.unlink(target)
+        except OSError:
+            pass
+        sock.bind(target)
+        return sock
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if is_multicast(target):
+        # Several overlays on one machine can all join the group.
+        sock.bind(('', target[1]))
+        group = socket.inet_aton(target[0]) + socket.inet_aton('0.0.0.0')
+        sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, group)
+    else:
+        sock.bind(target)
+    return sock
+
+class FeedSender(object):
+    # Call send(mgr) as often as the feed should be able to change; it only
+    # puts a packet on the wire when something changed or a FULL one is due.
+    def __init__(self, address=DEFAULT_ADDRESS, keyframe=KEYFRAME, ttl=1):
+        self.sock, self.target = open_sender(address, ttl)
+        self.keyframe = keyframe
+        self.session = random.getrandbits(32)
+        self.sequence = 0
+        self.base = None
+        self._base_values = None
+        self._base_time = None
+        self._values = None
+        self.sent = 0
+        self.full = 0
+        self.bytes = 0
+        self.errors = 0
+
+    def send(self, mgr):
+        sent = time.time()
+        values = read_fields(mgr)
+        now = time.monotonic()
+        if self.base is None or now - self._base_time >= self.keyframe:
+            kind = FULL
+            fields = range(len(values))
+        elif values != self._values:
+            kind = DELTA
+            fields = [f for f, v in enumerate(values) if v != self._base_values[f]]
+        else:
+            return False
+
+        self.sequence = (self.sequence + 1) & 0xffffffff
+        if kind == FULL:
+            self.base = self.sequence
+            self._base_values = values
+            self._base_time = now
+        self._values = values
+        packet = (HEADER.pack(MAGIC, VERSION, kind, len(fields), self.session,
+                              self.sequence, self.base, sent) +
+                  b''.join(encode_field(f, values[f]) for f in fields))
+        try:
+            self.sock.sendto(packet, self.target)
+        except OSError:
+            # Nobody listening on a unix socket yet, or the network is down:
+            # the next FULL packet catches receivers up.
+            self.errors += 1
+            return False
+        self.sent += 1
+        self.full += kind == FULL
+        self.bytes += len(packet)
+        return True
+
+    def close(self):
+        self.sock.close()
+
+class FieldsGameManager(ReadOnlyGameManager):
+    # GameManager stand-in showing read_fields() style values; adopt() swaps
+    # in a new set.
+    def adopt(self, values):
+        penalties = {}
+        for p in values[PENALTIES]:
+            p = SharedPenalty(*p)
+            penalties.setdefault(p.team(), []).append(p)
+        total, goals = values[GOALS]
+        self._state = tuple(values[:PENALTIES]) + (total, len(values[PENALTIES]), len(goals))
+        self._penalties = penalties
+        self._goals = [SharedGoal(*g) for g in goals]
+
+class FeedGameManager(FieldsGameManager):
+    # GameManager stand-in fed from the network. A listener thread decodes
+    # packets as they arrive; update(), called by the painter once a tick,
+    # adopts the newest state, so a frame never sees two.
+    def __init__(self, address=DEFAULT_ADDRESS):
+        FieldsGameManager.__init__(self)
+        self.address = address
+        self.sock = open_receiver(address)
+        self.sequence = None
+        self._session = None
+        self._base = None
+        self._base_values = None
+        self._values = list(EMPTY)
+        self._latest = None
+        self._adopted = None
+
+        # Sender time of the packet that brought the adopted state, for
+        # measuring how long changes take to reach the screen.
+        self.changed_at = None
+        self.received = 0
+        self.applied = 0
+        self.stale = 0
+        self.unsynced = 0
+        self.invalid = 0
+        self.transit = None
+
+    def listen(self):
+        while True:
+            try:
+                packet = self.sock.recv(65536)
+            except OSError:
+                return
+            self.apply(packet, time.time())
+
+    def listen_thread(self):
+        threading.Thread(target=self.listen, name='state-feed', daemon=True).start()
+
+    def apply(self, packet, received=None):
+        # Returns whether the packet was applied.
+        self.received += 1
+        try:
+            magic, version, kind, count, session, sequence, base, sent = \
+                HEADER.unpack_from(packet, 0)
+        except struct.error:
+            self.invalid += 1
+            return False
+        if magic != MAGIC or version != VERSION:
+            self.invalid += 1
+            return False
+        # A new sender, or one that restarted, takes over from its first FULL
+        # packet.
+        new_session = session != self._session
+        if new_session and kind != FULL:
+            self.unsynced += 1
+            return False
+        if (not new_session and
+            (sequence == self.sequence or
+             (sequence - self.sequence) & 0xffffffff >= 0x80000000)):
+            self.stale += 1
+            return False
+        if kind == DELTA and base != self._base:
+            # Relative to a FULL packet we never got.
+            self.unsynced += 1
+            return False
+
+        values = list(EMPTY if kind == FULL else self._base_values)
+        offset = HEADER.size
+        try:
+            for _ in range(count):
+                offset = decode_field(packet, offset, values)
+        except (struct.error, IndexError):
+            self.invalid += 1
+            return False
+
+        if kind == FULL:
+            self._session = session
+            self._base = sequence
+            self._base_values = values
+        self.sequence = sequence
+        self.applied += 1
+        if self.transit is not None and received is not None:
+            self.transit.append(received - sent)
+        if values != self._values:
+            self._values = values
+            self._latest = (values, sent)
+        return True
+
+    def update(self):
+        latest = self._latest
+        if latest is None or latest is self._adopted:
+            return False
+        self._adopted = latest
+        values, self.changed_at = latest
+        self.adopt(values)
+        return True
+
+    def summary(self):
+        return "%d packets: %d applied, %d stale, %d waiting for a full update, %d invalid" % (
+            self.received, self.applied, self.stale, self.unsynced, self.invalid)
+
+    def close(self):
+        self.sock.close()
+        family, target = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            try:
+                os.unlink(target)
+            except OSError:
+                pass
+
+def run_feed(shared, address, interval=0.01, parent=None):
+    # State process for a pool fed from the network: republishes the feed
+    # into the pool's shared game state block.
+    mgr = FeedGameManager(address)
+    mgr.listen_thread()
+    publisher = StatePublisher(shared)
+    scheduler = FrameScheduler(interval)
+    while parent is None or os.getppid() == parent:
+        scheduler.tick()
+        if mgr.update():
+            publisher.publish(mgr)
+        time.sleep(scheduler.delay())
+
+def relay(address, kind, config='timeshark.cfg', rate=50.0, keyframe=KEYFRAME, ttl=1):
+    # On the machine with the serial link: put what it hears on the network.
+    mgr = GameManager()
+    mgr.setPassive()
+    start_listener(mgr, kind, config)
+    sender = FeedSender(address, keyframe, ttl)
+    scheduler = FrameScheduler(1 / rate)
+    while True:
+        scheduler.tick()
+        sender.send(mgr)
+        time.sleep(scheduler.delay())
+
+def simulate(address, timeline='first_half', rate=20.0, speed=1.0, duration=None,
+             keyframe=KEYFRAME, ttl=1):
+    # Play a benchmark timeline into the feed, `rate` updates a second, with
+    # the game clock running `speed` times faster than real time.
+    from overlay.bench import TIMELINES, MOCK_TID, make_manager
+    steps = dict(TIMELINES)[timeline]
+    fps = max(1, int(round(rate / speed)))
+    sender = FeedSender(address, keyframe, ttl)
+    scheduler = FrameScheduler(1 / rate)
+    end = None if duration is None else time.monotonic() + duration
+    try:
+        while True:
+            mgr = make_manager(MOCK_TID)
+            for _ in steps(mgr, fps * 10 * 60, fps):
+                if end is not None and time.monotonic() >= end:
+                    return sender
+                scheduler.tick()
+                sender.send(mgr)
+                time.sleep(scheduler.delay())
+    finally:
+        sender.close()
+
+def measure(address, duration=10.0, version=None, interval=0.005, **simulation):
+    # Run the simulator in a child process and a headless overlay on the feed
+    # here, timing each change from the sender reading it to the frame that
+    # shows it being finished.
+    import multiprocessing
+    from overlay.bench import MOCK_TID
+    from overlay.headless import HeadlessOverlay
+    from overlay.mock_scores import MockUWHScores, MockTournament
+
+    mgr = FeedGameManager(address)
+    mgr.transit = []
+    context = multiprocessing.get_context('fork')
+    sender = context.Process(target=simulate, args=(address,),
+                             kwargs=dict(simulation, duration=duration), daemon=True)
+    sender.start()
+    mgr.listen_thread()
+
+    ov = HeadlessOverlay(mgr, version=version,
+                         uwhscores=MockUWHScores(MockTournament(MOCK_TID)))
+    scheduler = FrameScheduler(interval)
+    pixels = []
+    shown = None
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        scheduler.tick()
+        ov.refresh()
+        ov.poll()
+        if ov.stale():
+            ov.paint()
+            if mgr.changed_at is not None and mgr.changed_at != shown:
+                shown = mgr.changed_at
+                pixels.append(time.time() - shown)
+        time.sleep(scheduler.delay())
+    sender.join(5)
+    mgr.close()
+
+    transit = sorted(mgr.transit)
+    pixels.sort()
+    stats = {
+        'packets' : mgr.received,
+        'changes' : len(pixels),
+        'transit_p50_ms' : percentile(transit, 50) * 1000,
+        'transit_p99_ms' : percentile(transit, 99) * 1000,
+        'pixel_p50_ms' : percentile(pixels, 50) * 1000,
+        'pixel_p99_ms' : percentile(pixels, 99) * 1000,
+        'pixel_max_ms' : pixels[-1] * 1000 if pixels else 0.0,
+    }
+    print(mgr.summary())
+    print("%(changes)d changes shown; packet to receiver p50 %(transit_p50_ms).2f ms, "
+          "p99 %(transit_p99_ms).2f ms; update to pixel p50 %(pixel_p50_ms).2f ms, "
+          "p99 %(pixel_p99_ms).2f ms, max %(pixel_max_ms).2f ms" % stats)
+    return stats
+
+def main(argv=None):
+    import argparse
+    from overlay.bench import TIMELINES
+    from overlay.painter import OverlayPainter
+    parser = argparse.ArgumentParser(description='Send, relay or measure the network game state feed')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    sim = commands.add_parser('simulate', help='Play a scripted game into the feed')
+    meas = commands.add_parser('measure', help='Simulate a game and time how long its changes '
+                               'take to reach a headless overlay on this machine')
+    rel = commands.add_parser('relay', help='Send what an XBee or RS485 link hears')
+    for p in (sim, meas, rel):
+        p.add_argument('address', nargs='?', default=DEFAULT_ADDRESS,
+                       help='udp://HOST:PORT (multicast or unicast) or unix:///PATH, default %s'
+                       % (DEFAULT_ADDRESS,))
+        p.add_argument('--keyframe', type=float, default=KEYFRAME,
+                       help='Seconds between full updates')
+        p.add_argument('--ttl', type=int, default=1, help='Multicast TTL')
+    for p in (sim, meas):
+        p.add_argument('--timeline', choices=[name for name, _ in TIMELINES],
+                       default='first_half')
+        p.add_argument('--rate', type=float, default=20.0,
+                       help='Updates a second')
+        p.add_argument('--speed', type=float, default=1.0,
+                       help='Game seconds per second')
+        p.add_argument('--duration', type=float, default=None,
+                       help='Seconds to run for')
+    meas.add_argument('--version', choices=OverlayPainter.versions(), default=None)
+    rel.add_argument('--rs485', action='store_const', const='rs485', default='xbee',
+                     dest='kind', help='The link is RS485, not XBee')
+    rel.add_argument('--config', default='timeshark.cfg')
+    rel.add_argument('--rate', type=float, default=50.0,
+                     help='How often to check for changes, a second')
+    args = parser.parse_args(argv)
+
+    try:
+        parse_address(args.address)
+        if args.command == 'simulate':
+            sender = simulate(args.address, args.timeline, args.rate, args.speed,
+                              args.duration, args.keyframe, args.ttl)
+            print("%d packets (%d full), %d bytes" % (sender.sent, sender.full, sender.bytes))
+        elif args.command == 'measure':
+            measure(args.address, args.duration or 10.0, args.version,
+                    timeline=args.timeline, rate=args.rate, speed=args.speed,
+                    keyframe=args.keyframe, ttl=args.ttl)
+        else:
+            relay(args.address, args.kind, args.config, args.rate, args.keyframe, args.ttl)
+    except ValueError as e:
+        parser.error(str(e))
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,841 @@
+import re
+import time
+from uwh.gamemanager import TeamColor, GameState, TimeoutState
+from overlay.assets import AssetCache
+from overlay.backend import NW, NE, W, E, CENTER
+from overlay.fetch import ScoresFetcher
+from overlay.flags import FlagPipeline
+from overlay.gamedata import GameData, abbreviate, next_gid
+from overlay.layout import LAYOUTS, compile_layout
+from overlay.profiler import NullProfiler, StartupTimer
+from overlay.sharedstate import ReadOnlyGameManager
+from overlay.snapshot import GameSnapshot
+
+class MaskKind:
+    NONE, CHROMA, VMAC, LUMA = range(4)
+
+def startup_assets(version, mask, size):
+    # (path, size) of every image a version of the overlay draws with `mask`,
+    # at the size it draws it, in layout units.
+    layout = compile_layout(version, size[0], size[1])
+    assets = [('res/gofundme.png', (300, 400))]
+    if mask == MaskKind.VMAC:
+        assets.append(('res/vmac.png', size))
+    if layout.status.sticker is not None:
+        assets.append(('res/worlds-cmas-sticker.png', layout.status.sticker[1]))
+    for lay in layout.rosters.values():
+        for placed in (lay.logo, lay.results_logo):
+            if placed is not None:
+                assets.append(('res/logo-worlds2018.png', placed[1]))
+        assets.append(('res/navisjon.png', lay.navisjon[1]))
+    return assets
+
+class OverlayPainter(object):
+    # Everything the overlay shows, drawn through self.backend. The Tk window
+    # and the headless renderer only differ in which backend they hand in.
+    # `bbox` is the size the overlay is laid out at; the backend's scale
+    # decides how many pixels that ends up as.
+
+    # Seconds left on the clock in the last period when the next game starts
+    # being prepared.
+    prefetch_lead = 120
+
+    # Every font the views draw with, in layout points, for loading ahead of
+    # time.
+    fonts = (("Avenir Next LT Pro", 15, "bold"), ("Avenir Next LT Pro", 15, "underline"),
+             ("Avenir Next LT Pro", 16, "bold"), ("Avenir Next LT Pro", 20),
+             ("Avenir Next LT Pro", 20, "bold"), ("Avenir Next LT Pro", 24, "bold"),
+             ("Avenir Next LT Pro", 35, "bold"), ("Avenir Next LT Pro", 40),
+             ("Avenir Next LT Pro", 160, "bold"))
+
+    def __init__(self, bbox, mgr, mask, version, demo, backend,
+                 uwhscores=None, photos=True, profiler=None, flag_cache=None,
+                 assets=None, started=None):
+        self.w = bbox[0]
+        self.h = bbox[1]
+        self.mgr = mgr
+        self.mask = mask
+        self.version = version
+        self.demo = demo
+        self.backend = backend
+        self.profiler = profiler or NullProfiler()
+        # `started` is when the process started, if the caller knows; only
+        # then are startup times worth printing.
+        self.startup = StartupTimer(started, report=started is not None)
+        self.profiler.attach(self.startup)
+        if assets is None:
+            assets = AssetCache(scale=backend.scale)
+        self.assets = assets
+        self.layout = compile_layout(version, self.w, self.h)
+        self.flag_sizes = self.layout.flag_sizes
+
+        if uwhscores is None:
+            uwhscores = ScoresFetcher('https://uwhscores.com/api/v1/')
+            #uwhscores = ScoresFetcher('http://192.168.50.52:5000/api/v1/')
+        self.uwhscores = uwhscores
+        self.flags = FlagPipeline(self.uwhscores, self.flag_sizes,
+                                  cache_dir=flag_cache, photos=photos,
+                                  scale=backend.scale)
+        self.tid = None
+        self.gid = None
+        self.reset_uwhscores()
+
+        # What the current frame is drawn from; see GameSnapshot.
+        self.snap = GameSnapshot(mgr)
+        self.left, self.right = self.snap.sides(self.data)
+        self._snap_judged = False
+
+        # Set whenever new data lands that the snapshot key can't see.
+        self.dirty = True
+        self._shown_key = None
+
+    def warm_up(self):
+        # Everything a first frame would otherwise stop for: images decoded
+        # and scaled, and fonts loaded. Text and panels get cached by drawing
+        # that frame.
+        start = time.monotonic()
+        self.assets.preload(startup_assets(self.version, self.mask, (self.w, self.h)))
+        self.backend.preload_fonts(self.fonts)
+        self.startup.warm_up = time.monotonic() - start
+
+    def has_full_data(self):
+        # Whether UWHScores has filled in everything about the game on screen.
+        return (self.data.game is not None and
+                self.data.black_roster is not None and self.data.white_roster is not None and
+                all(self.flag(side, size) is not None
+                    for side in ('left', 'right') for size in self.flag_sizes))
+
+    def frame_shown(self):
+        # Called once a frame is out, for the startup times.
+        if self.startup.first_full_frame is None:
+            self.startup.frame(self.has_full_data())
+
+    def poll(self):
+        # Adopt whatever the background fetchers finished since the last tick.
+        # UWHScores callbacks flag their own changes. Game state from a comms
+        # process, a network feed or a recording is copied in here, once a tick.
+        if isinstance(self.mgr, ReadOnlyGameManager):
+            self.mgr.update()
+        self.uwhscores.drain()
+        if self.flags.drain():
+            self.dirty = True
+
+    def stale(self):
+        # Whether the last painted frame no longer matches what should be on
+        # screen. Goal banners expire on a clock second, so the clock in the
+        # key covers them too. A paint() straight after draws the snapshot
+        # this judged.
+        self.snap = GameSnapshot(self.mgr)
+        key = self.snap.key
+        if self.dirty or key != self._shown_key:
+            self.dirty = False
+            self._shown_key = key
+            self._snap_judged = True
+            return True
+        self._snap_judged = False
+        return False
+
+    def paint(self):
+        prof = self.profiler
+        if not self._snap_judged:
+            with prof.stage('snapshot'):
+                self.snap = GameSnapshot(self.mgr)
+        self._snap_judged = False
+        with prof.stage('paint'):
+            self.backend.begin()
+            with prof.stage('background'):
+                if self.mask == MaskKind.VMAC:
+                    # Borrowed from the first few minutes of: https://www.youtube.com/watch?v=hb8NU1LdhnI
+                    vmac = self.assets.get('res/vmac.png', (self.w, self.h))
+                    self.backend.image((0, 0), anchor=NW, image=vmac)
+                elif self.mask == MaskKind.LUMA:
+                    # Leave the background transparent: its alpha is the key.
+                    pass
+                else:
+                    self.clear(fill=self.color("bg"))
+            with prof.stage('render'):
+                self.render()
+            with prof.stage('backend_end'):
+                return self.backend.end()
+
+    def clear(self, fill):
+        self.backend.rectangle((0, 0, self.w, self.h), fill=fill)
+
+    @staticmethod
+    def round_rectangle_shapes(bbox, radius, fill, fill_t=None, fill_b=None):
+        x1, y1, x2, y2 = bbox
+        fill_t = fill_t or fill
+        fill_b = fill_b or fill
+        return [('arc', (x2 - radius, y1, x2 + radius, y2), fill_t, fill_t, 0),
+                ('arc', (x1 - radius, y1, x1 + radius, y2), fill_t, fill_t, 90),
+                ('arc', (x1 - radius, y1, x1 + radius, y2), fill_b, fill_b, 180),
+                ('arc', (x2 - radius, y1, x2 + radius, y2), fill_b, fill_b, 270),
+                ('rectangle', (x1, y1, x2, (y1+y2)/2), fill_t, fill_t, 0),
+                ('rectangle', (x1, (y1+y2)/2, x2, y2), fill_b, fill_b, 0)]
+
+    # Panels are drawn by the backend as one cached sprite each, rather than
+    # as the half dozen arcs and rectangles they're made of.
+    def round_rectangle(self, bbox, radius, fill, fill_t=None, fill_b=None):
+        self.backend.shapes(self.round_rectangle_shapes(bbox, radius, fill, fill_t, fill_b))
+
+    def bordered_round_rectangle(self, bbox, radius, outset, fill, border,
+                                 fill_t=None, fill_b=None, border_t=None, border_b=None):
+        shapes = self.round_rectangle_shapes((bbox[0]-outset, bbox[1]-outset,
+                                              bbox[2]+outset, bbox[3]+outset),
+                                             radius=radius, fill=border,
+                                             fill_t=border_t, fill_b=border_b)
+        shapes += self.round_rectangle_shapes(bbox, radius=radius, fill=fill,
+                                              fill_t=fill_t, fill_b=fill_b)
+        self.backend.shapes(shapes)
+
+    def bordered_circle(self, bbox, outset, fill, border):
+        # Ovals keep Tk's default black outline.
+        self.backend.shapes([('oval', (bbox[0]-outset, bbox[1]-outset,
+                                       bbox[2]+outset, bbox[3]+outset), border, '#000000', 0),
+                             ('oval', bbox, fill, '#000000', 0)])
+
+    @staticmethod
+    def versions():
+        return list(LAYOUTS)
+
+    def get(self, side, feature):
+        team = self.left if side == 'left' else self.right
+        return getattr(team, feature)
+
+    def flag(self, side, size):
+        return self.flags.get(self.tid, self.get(side, 'id'), size)
+
+    def reset_uwhscores(self):
+        self.data = GameData()
+        self.upcoming = None
+        self.schedule = {}
+
+    def load_game(self, tid, gid, data=None):
+        # Request everything about one game into `data` (a fresh GameData
+        # unless given). Only changes to the bundle on screen mark it dirty.
+        # A request that failed calls back with None, which keeps whatever
+        # the bundle already had until the next refresh asks again.
+        if data is None:
+            data = GameData(tid, gid)
+        def changed():
+            if data is self.data:
+                self.dirty = True
+        def game(response):
+            if response is None:
+                return
+            if response != data.game:
+                changed()
+            data.game = response
+            data.black_name = response['black']
+            data.white_name = response['white']
+            data.black_id = response['black_id']
+            data.white_id = response['white_id']
+            def black_roster(roster):
+                if roster is not None and data.set_roster('black', roster):
+                    changed()
+            def white_roster(roster):
+                if roster is not None and data.set_roster('white', roster):
+                    changed()
+            self.uwhscores.get_roster(tid, data.black_id, black_roster)
+            self.uwhscores.get_roster(tid, data.white_id, white_roster)
+            self.flags.request(tid, data.black_id)
+            self.flags.request(tid, data.white_id)
+
+        self.uwhscores.get_game(tid, gid, game)
+
+        def tournament(response):
+            if response is None:
+                return
+            if response != data.tournament:
+                changed()
+            data.tournament = response
+        self.uwhscores.get_tournament(tid, tournament)
+        return data
+
+    def fetch_uwhscores(self):
+        # Goes by the snapshot, like the frame, so it fetches for the game on
+        # screen even if the GameManager has moved on since.
+        self.tid = self.snap.tid
+        self.gid = self.snap.gid
+        if self.data.matches(self.tid, self.gid):
+            self.load_game(self.tid, self.gid, self.data)
+        elif self.upcoming is not None and self.upcoming.matches(self.tid, self.gid):
+            # Prepared while the last game wound down: swap it in whole, then
+            # refresh it like any other.
+            self.data = self.upcoming
+            self.upcoming = None
+            self.dirty = True
+            self.load_game(self.tid, self.gid, self.data)
+        else:
+            self.data = self.load_game(self.tid, self.gid)
+            self.dirty = True
+        self.prefetch_next()
+
+    def prefetch_next(self):
+        # Once the game on screen is nearly done, get the one after it ready:
+        # game, names, rosters and scaled flags.
+        state = self.snap.game_state
+        if not (state == GameState.game_over or
+                (state in (GameState.second_half, GameState.ot_second) and
+                 self.snap.game_clock <= self.prefetch_lead)):
+            return
+        game = self.data.game
+        if game is None:
+            return
+
+        tid = self.data.tid
+        if tid not in self.schedule:
+            # Wait for the schedule to pick the right game. If it never turns
+            # up, or comes back None, later calls settle for gid + 1.
+            self.schedule[tid] = None
+            def game_list(response):
+                self.schedule[tid] = response
+                self.prefetch_next()
+            self.uwhscores.get_game_list(tid, game_list)
+            return
+
+        gid = next_gid(game, self.schedule[tid])
+        if self.upcoming is None or not self.upcoming.matches(tid, gid):
+            self.upcoming = self.load_game(tid, gid)
+
+    def render(self):
+        # Force update of teams between games
+        prof = self.profiler
+        snap = self.snap
+        if (self.tid != snap.tid or
+            self.gid != snap.gid):
+            with prof.stage('fetch_uwhscores'):
+                self.fetch_uwhscores()
+        self.left, self.right = snap.sides(self.data)
+
+        if (snap.game_state != GameState.game_over and
+            (snap.game_state != GameState.pre_game or
+             snap.game_clock < 15)):
+            with prof.stage('game_play_view'):
+                self.game_play_view()
+
+            if (snap.game_state == GameState.half_time and
+                snap.game_clock >= 15):
+                with prof.stage('roster_bar_view'):
+                    self.roster_view(bar_only=True)
+                with prof.stage('gofundme'):
+                    self.gofundme()
+
+        elif (self.data.game is None and
+              self.data.tournament is None):
+            with prof.stage('game_play_view'):
+                self.game_play_view()
+
+            if snap.game_state == GameState.half_time:
+                with prof.stage('roster_bar_view'):
+                    self.roster_view(bar_only=True)
+                with prof.stage('gofundme'):
+                    self.gofundme()
+
+        else:
+            with prof.stage('roster_view'):
+                self.roster_view()
+
+    def gofundme(self):
+        height = 100
+        width = 325
+        radius = 10
+        outset = 3
+
+        center_x = self.w * 4 / 5
+
+        logo = self.assets.get('res/gofundme.png', (300, 400))
+        self.backend.image((center_x, self.h / 2), anchor=CENTER, image=logo)
+
+
+        self.bordered_round_rectangle(bbox=(center_x - width /2,
+                                            self.h * 1 / 4 - height/2,
+                                            center_x + width /2,
+                                            self.h * 1 / 4 + height/2),
+                                      radius=radius, outset=outset,
+                                      fill="#000000",
+                                      border="#ffffff")
+
+        font = ("Avenir Next LT Pro", 15, "bold")
+
+        self.backend.text((center_x, self.h * 1/4 - 25), text="GoFundMe Underwater\nHockey World Champs 2018",
+                        fill="#ffffff", font=font, anchor=CENTER)
+
+        font = ("Avenir Next LT Pro", 15, "underline")
+
+        self.backend.text((center_x, self.h * 1/4 + 25), text="http://bit.ly/2mzRBFe",
+                        fill="#4040ff", font=font, anchor=CENTER)
+
+
+    def color(self, name):
+        if self.mask == MaskKind.CHROMA and name == "bg":
+            return "#00ff00"
+
+        return {
+            "bg" : "#054a91",
+            "border" : "#ffffff",
+            "fill" : "#313FA1",
+            "fill_text" : "#ffffff",
+            "black_fill" : "#000000",
+            "black_text" : "#2e96ff",
+            "white_fill" : "#ffffff",
+            "white_text" : "#313FA1",
+            "team_text"  : "#000000",
+            "title_text" : "#ffffff",
+        }.get(name, "#ff0000")
+
+    def abbreviate(self, s, max_len = 16):
+        return abbreviate(s, max_len)
+
+    def game_play_view(self):
+        snap = self.snap
+        left = self.left
+        right = self.right
+        lay = self.layout.status
+        radius = lay.radius
+        outset = lay.outset
+
+        font=("Avenir Next LT Pro", 15, "bold")
+        score_font=("Avenir Next LT Pro", 24, "bold")
+        time_font=("Avenir Next LT Pro", 40)
+        state_font=("Avenir Next LT Pro", 16, "bold")
+
+        # Bottom Rectangle
+        if snap.highlight_timeout:
+            if snap.timeout_state == TimeoutState.ref:
+                L_fill_color = "#ffff00"
+                border_color = "#000000"
+            elif snap.timeout_state == TimeoutState.white:
+                R_fill_color = "#ffff00"
+                L_fill_color = "#ffffff"
+                border_color = "#000000"
+            elif snap.timeout_state == TimeoutState.black:
+                R_fill_color = "#ffff00"
+                L_fill_color = "#000000"
+                border_color = "#ffffff"
+            elif (snap.timeout_state == TimeoutState.penalty_shot or
+                  snap.is_overtime or snap.is_sudden_death):
+                L_fill_color = "#ff0000"
+                border_color = "#000000"
+
+            if snap.is_team_timeout:
+
+                # ((       )    (   ))    )####)
+                self.bordered_round_rectangle(bbox=lay.team_timeout_box,
+                                              radius=radius, outset=outset,
+                                              fill=R_fill_color,
+                                              border="#000000")
+
+            # ((       )    (   ))####)
+            self.bordered_round_rectangle(bbox=lay.timeout_box,
+                                          radius=radius, outset=outset,
+                                          fill=L_fill_color,
+                                          border=border_color)
+
+
+
+        # ((       )####(   ))    )
+        self.bordered_round_rectangle(bbox=lay.state_box,
+                                      radius=radius, outset=outset,
+                                      fill=self.color("fill"),
+                                      border=self.color("border"))
+
+        # ((#######)    (   ))    )
+        self.bordered_round_rectangle(bbox=lay.team_box,
+                                      radius=radius, outset=outset,
+                                      fill=None,
+                                      fill_t=left.color,
+                                      fill_b=right.color,
+                                      border=None,
+                                      border_t=right.color,
+                                      border_b=left.color)
+
+        # ((       )    (###))    )
+        time_fill = self.color("fill")
+        time_border=self.color("border")
+        self.bordered_round_rectangle(bbox=lay.time_box,
+                                      radius=radius, outset=outset,
+                                      fill=time_fill,
+                                      border=time_border)
+
+        if lay.sticker is not None:
+            xy, size = lay.sticker
+            logo = self.assets.get('res/worlds-cmas-sticker.png', size)
+            self.backend.image(xy, anchor=NE, image=logo)
+
+        # Flags
+        left_flag = self.flag('left', lay.flag_size)
+        if left_flag is not None:
+            self.backend.image(lay.top_flag, anchor=NE, image=left_flag)
+
+        right_flag = self.flag('right', lay.flag_size)
+        if right_flag is not None:
+            self.backend.image(lay.bottom_flag, anchor=NE, image=right_flag)
+
+        # Scores Fill
+        self.round_rectangle(bbox=lay.top_score_box,
+                             radius=lay.score_radius, fill=left.color)
+        self.round_rectangle(bbox=lay.bottom_score_box,
+                             radius=lay.score_radius, fill=right.color)
+
+        # Timeout
+        timeout_text=""
+        text_color = self.color('fill_text')
+        if snap.timeout_state == TimeoutState.ref:
+            timeout_text="Ref\nTimeout"
+            text_color="#000000"
+        elif snap.timeout_state == TimeoutState.white:
+            timeout_text="White\nTimeout"
+            text_color="#000000"
+        elif snap.timeout_state == TimeoutState.black:
+            timeout_text="Black\nTimeout"
+            text_color="#ffffff"
+        elif snap.timeout_state == TimeoutState.penalty_shot:
+            timeout_text="Penalty\nShot"
+            text_color="#000000"
+        elif snap.is_overtime:
+            timeout_text="Overtime"
+            text_color="#000000"
+        elif snap.is_sudden_death:
+            timeout_text="Sudden\nDeath"
+            text_color="#000000"
+        self.backend.text(lay.timeout_text,
+                       text=timeout_text, fill=text_color, font=state_font, anchor=W)
+
+        if snap.is_team_timeout:
+            clock_time = snap.game_clock
+            clock_text = "%02d" % (clock_time,)
+            self.backend.text(lay.timeout_clock,
+                            text=clock_time, fill="#000000", font=time_font, anchor=E)
+
+        # Game State Text
+        state_text=""
+        if snap.game_state == GameState.pre_game:
+            state_text="Pre\nGame"
+        if (snap.game_state == GameState.first_half or
+            snap.game_state == GameState.ot_first):
+            state_text="1st\nHalf"
+        elif (snap.game_state == GameState.second_half or
+            snap.game_state == GameState.ot_second):
+            state_text="2nd\nHalf"
+        elif (snap.game_state == GameState.half_time or
+              snap.game_state == GameState.ot_half):
+            state_text="Half\nTime"
+        elif snap.game_state == GameState.game_over:
+            state_text="Game\nOver"
+        elif (snap.game_state == GameState.pre_ot or
+              snap.game_state == GameState.pre_sudden_death):
+            state_text="Break"
+        self.backend.text(lay.state_text,
+                       text=state_text, fill=self.color("fill_text"), font=state_font, anchor=W)
+
+        # Time Text
+        time_fill=self.color("fill_text")
+        clock_time = snap.clock_at_pause
+        clock_text = "%2d:%02d" % (clock_time // 60, clock_time % 60)
+        self.backend.text(lay.time_text,
+                        text=clock_text, fill=time_fill,
+                        font=time_font, anchor=CENTER)
+
+        # White Score Text
+        left_score = left.score
+        l_score="%d" % (left_score,)
+        self.backend.text(lay.top_score,
+                        text=l_score, fill=right.color,
+                        font=score_font, anchor=CENTER)
+
+        # Black Score Text
+        right_score = right.score
+        r_score="%d" % (right_score,)
+        self.backend.text(lay.bottom_score,
+                        text=r_score, fill=left.color,
+                        font=score_font, anchor=CENTER)
+
+        # Team Names
+        white_team=left.name
+        white_team=re.sub(r'\(.*\)', '', white_team)
+        white_team=self.abbreviate(white_team, 24)
+        self.backend.text(lay.top_name, text=white_team,
+                        fill=right.color, anchor=W, font=font)
+
+        black_team=right.name
+        black_team=re.sub(r'\(.*\)', '', black_team)
+        black_team=self.abbreviate(black_team, 24)
+        self.backend.text(lay.bottom_name, text=black_team,
+                        fill=left.color, anchor=W, font=font)
+
+        def player_name(player_no, team):
+            if team == TeamColor.black:
+                roster = self.data.black_roster
+            else:
+                roster = self.data.white_roster
+
+            if roster is not None:
+                return roster.short_name(player_no)
+            return None
+
+        # Goals
+        x1 = lay.list_x
+        y1 = lay.list_y
+        y_offset = 0
+
+        g = snap.goal
+        # Display goals for at most 30 seconds after they were scored
+        if g is not None and g.time - 30 < snap.clock_at_pause:
+            name = player_name(g.player, g.team)
+            if name is not None:
+                goal_width = lay.player_width
+            else:
+                name = ""
+                goal_width = lay.unnamed_width
+
+            fill_color = "#000000" if g.team == TeamColor.black else "#ffffff"
+            text_color = "#ffffff" if g.team == TeamColor.black else "#000000"
+            self.bordered_round_rectangle(bbox=(x1, y1 + y_offset,
+                                                x1 + goal_width,
+                                                y1 + y_offset + lay.goal_height),
+                                          radius=radius, fill=fill_color, border=text_color,
+                                          outset=outset)
+
+            goal_text = "Goal: #%d - %s" % (g.player, name)
+            self.backend.text((x1, y1 + y_offset + lay.goal_height / 2), text=goal_text,
+                            fill=text_color, anchor=W, font=font)
+
+            y_offset += lay.goal_height + lay.v_spacing
+
+        # Sin-bin
+        penalty_height = lay.penalty_height
+
+        for p in snap.shown_penalties():
+            name = player_name(p.player, p.team)
+            if name is not None:
+                penalty_width = lay.player_width
+            else:
+                name = ""
+                penalty_width = lay.unnamed_width
+
+            fill_color = "#000000" if p.team == TeamColor.black else "#ffffff"
+            text_color = "#ffffff" if p.team == TeamColor.black else "#000000"
+            self.bordered_round_rectangle(bbox=(x1, y1 + y_offset,
+                                                x1 + penalty_width,
+                                                y1 + y_offset + penalty_height),
+                                          radius=radius, fill=fill_color, border="#ff0000",
+                                          outset=outset)
+
+            penalty_text = "#%d - %s" % (p.player, name)
+            self.backend.text((x1, y1 + y_offset + penalty_height / 2), text=penalty_text,
+                            fill=text_color, anchor=W, font=font)
+
+            if p.dismissed:
+                penalty_text = "X"
+            else:
+                penalty_text = "%d:%02d" % (p.remaining // 60, p.remaining % 60)
+            self.backend.text((x1 + penalty_width, y1 + y_offset + penalty_height / 2), text=penalty_text,
+                            fill=text_color, anchor=E, font=font)
+
+            y_offset += penalty_height + lay.v_spacing
+
+
+    def roster_view(self, bar_only=False):
+        snap = self.snap
+        left = self.left
+        right = self.right
+        font=("Avenir Next LT Pro", 20)
+        team_font=("Avenir Next LT Pro", 35, "bold")
+        players_font=("Avenir Next LT Pro", 20, "bold")
+        title_font=("Avenir Next LT Pro", 20, "bold")
+
+        if bar_only:
+            view = 'half_time'
+        elif snap.game_state == GameState.pre_game:
+            view = 'pre_game'
+        else:
+            view = 'results'
+        lay = self.layout.rosters[(self.data.game is not None, view)]
+        radius = lay.radius
+        outset = lay.outset
+
+        self.bordered_round_rectangle(bbox=lay.bar_box,
+                                      radius=radius, outset=outset,
+                                      fill=self.color('fill'),
+                                      border=self.color("border"))
+
+        # Flags
+        left_flag = self.flag('left', lay.flag_size)
+        if left_flag is not None:
+            self.backend.image(lay.left_flag, anchor=NE, image=left_flag)
+
+            self.bordered_round_rectangle(bbox=lay.left_team_box,
+                                          radius=radius, outset=outset,
+                                          fill=left.color,
+                                          border=right.color)
+
+        right_flag = self.flag('right', lay.flag_size)
+        if right_flag is not None:
+            self.backend.image(lay.right_flag, anchor=NW, image=right_flag)
+
+            self.bordered_round_rectangle(bbox=lay.right_team_box,
+                                          radius=radius, outset=outset,
+                                          fill=right.color,
+                                          border=left.color)
+
+        self.bordered_round_rectangle(bbox=lay.title_box,
+                                      radius=radius, outset=outset,
+                                      fill=self.color('fill'),
+                                      border=self.color("border"))
+
+        # Team Names
+        name = left.name
+        name=re.sub(r'\(.*\)', '', name)
+        if name is not None:
+            self.backend.text(lay.left_name, text=name,
+                            fill=right.color, font=team_font, anchor=CENTER)
+
+        name = right.name
+        name=re.sub(r'\(.*\)', '', name)
+        if name is not None:
+            self.backend.text(lay.right_name, text=name,
+                            fill=left.color, font=team_font, anchor=CENTER)
+
+        # Tournament / Game info
+        top_xy, middle_xy, bottom_xy = lay.title_lines
+        if self.data.game is not None:
+
+            if self.tid == 17:
+                if 200 <= self.gid:
+                    top_text = "#PO" + str(self.gid)
+                else:
+                    top_text = "#" + str(self.gid)
+            else:
+                game_type = self.data.game['game_type']
+                game_type = {
+                    "RR" : "Round Robin",
+                    "CO" : "Crossover",
+                    "BR" : "Bracket",
+                    "E"  : "Exhibition",
+                }.get(game_type, game_type)
+                top_text = "{} #{}".format(game_type, self.gid)
+
+            self.backend.text(top_xy, text=top_text,
+                            fill=self.color("title_text"), font=title_font,
+                            anchor=CENTER)
+
+            game_state = ""
+            if self.tid == 17 and self.data.game['description'] is not None:
+                game_state = self.data.game['description']
+            elif snap.game_state == GameState.game_over:
+                game_state = "Final Scores"
+            elif snap.game_state == GameState.half_time:
+                game_state = "Half Time"
+            self.backend.text(middle_xy, text=game_state,
+                            fill=self.color("title_text"), font=title_font,
+                            anchor=CENTER)
+
+            from datetime import datetime
+            import calendar
+            start = datetime.strptime(self.data.game['start_time'], "%Y-%m-%dT%H:%M:%S")
+            bottom_text = "Pool {}, {} {}".format(self.data.game['pool'],
+                                                  calendar.day_abbr[start.weekday()],
+                                                  start.strftime("%H:%M"))
+
+            self.backend.text(bottom_xy, text=bottom_text,
+                            fill=self.color("title_text"), font=title_font,
+                            anchor=CENTER)
+
+        elif self.data.tournament is not None:
+            self.backend.text(top_xy, text=self.data.tournament['name'],
+                            fill=self.color("title_text"), font=title_font,
+                            anchor=CENTER)
+
+            game_state = ""
+            if snap.game_state == GameState.game_over:
+                game_state = "Final Scores"
+            elif snap.game_state == GameState.half_time:
+                game_state = "Half Time"
+            self.backend.text(middle_xy, text=game_state,
+                            fill=self.color("title_text"), font=title_font,
+                            anchor=CENTER)
+
+            self.backend.text(bottom_xy, text=self.data.tournament['location'],
+                            fill=self.color("title_text"), font=title_font,
+                            anchor=CENTER)
+
+        if bar_only:
+            return
+
+        # Roster
+        if snap.game_state == GameState.pre_game:
+            # Rows past the bottom of the screen aren't in the table.
+            roster = left.roster
+            if roster is not None:
+                for player, (box, xy) in zip(roster, lay.left_rows):
+                    self.round_rectangle(bbox=box, radius=radius,
+                                         fill=left.color)
+                    self.backend.text(xy, text=player.roster_text,
+                                    fill=right.color, font=players_font,
+                                    anchor=W)
+
+            roster = right.roster
+            if roster is not None:
+                for player, (box, xy) in zip(roster, lay.right_rows):
+                    self.round_rectangle(bbox=box, radius=radius,
+                                         fill=right.color)
+                    self.backend.text(xy, text=player.roster_text,
+                                    fill=left.color, font=players_font,
+                                    anchor=W)
+
+            # Worlds
+            if lay.logo is not None:
+                xy, size = lay.logo
+                logo = self.assets.get('res/logo-worlds2018.png', size)
+                self.backend.image(xy, anchor=CENTER, image=logo)
+
+            # Nationals
+            #logo = self.assets.get('res/logo-nationals2018.png', (400, 400))
+            #self.backend.image((center_x, 625), anchor=CENTER, image=logo)
+
+            # Navisjon
+            xy, size = lay.navisjon
+            navisjon = self.assets.get('res/navisjon.png', size)
+            self.backend.image(xy, anchor=CENTER, image=navisjon)
+        else:
+            score_font=("Avenir Next LT Pro", 160, "bold")
+            self.bordered_circle(bbox=lay.left_score_box,
+                                 fill=left.color,
+                                 border=right.color,
+                                 outset=outset)
+            self.bordered_circle(bbox=lay.right_score_box,
+                                 fill=right.color,
+                                 border=left.color,
+                                 outset=outset)
+            self.backend.text(lay.left_score, text=left.score,
+                            fill=right.color, font=score_font, anchor=CENTER)
+            self.backend.text(lay.right_score, text=right.score,
+                            fill=left.color, font=score_font, anchor=CENTER)
+
+            # Worlds
+            if lay.results_logo is not None:
+                xy, size = lay.results_logo
+                logo = self.assets.get('res/logo-worlds2018.png', size)
+                self.backend.image(xy, anchor=CENTER, image=logo)
+
+            # Navisjon
+            xy, size = lay.navisjon
+            navisjon = self.assets.get('res/navisjon.png', size)
+            self.backend.image(xy, anchor=CENTER, image=navisjon)
+
+
+        self.bordered_round_rectangle(lay.next_box,
+                                      fill=self.color('fill'), border="#ffffff",
+                                      outset=outset, radius=radius)
+
+        if snap.game_state == GameState.pre_game:
+            next_time = snap.game_clock
+            next_status = "Start: "
+        else:
+            next_time = snap.game_clock + 3 * 60
+            next_status = "Next: "
+
+        next_in_text = next_status + "%2d:%02d" % (next_time // 60, next_time % 60)
+        self.backend.text(lay.next_text, text=next_in_text,
+                        fill="#ffffff", font=title_font, anchor=W)
@@ -0,0 +1,231 @@
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+from overlay.assets import AssetCache
+from overlay.bench import TIMELINES, MOCK_TID, make_manager
+from overlay.fetch import ScoresFetcher
+from overlay.headless import HeadlessOverlay
+from overlay.netfeed import parse_address, run_feed
+from overlay.painter import OverlayPainter, MaskKind, startup_assets
+from overlay.scheduler import FrameScheduler
+from overlay.sharedstate import SharedGameState, SharedGameManager, StatePublisher, run_comms
+from overlay.shmring import FrameRing, FORMAT_RGBA, FORMAT_FILL_KEY
+from overlay.store import StoreScores
+from overlay.stream import PacedWriter, FORMATS
+
+# Several pools' overlays from one machine.
+#
+# Every pool gets a state process (its XBee or RS485 link, a network state
+# feed, or a scripted timeline) publishing into a shared game state block,
+# and a render process drawing from that block into the pool's frame ring or
+# stream. The host
+# process in the middle is the only one talking to UWHScores: it keeps the
+# local store in sync for every tournament the pools are showing, and the
+# render processes reload it from disk. Images are decoded and scaled once
+# in the host before the render processes fork off, so they share those
+# pages rather than each making their own.
+
+SOURCES = ('xbee', 'rs485', 'timeline', 'feed')
+
+class Pool(object):
+    # One pool: where its game state comes from and where its frames go.
+    def __init__(self, name, source, config=None, version=None, mask=MaskKind.NONE,
+                 shm=None, stream=None):
+        self.name = name
+        self.source = source
+        self.config = config
+        self.version = version
+        self.mask = mask
+        self.shm = shm
+        self.stream = stream
+        if shm is None and stream is None:
+            self.shm = 'uwh-overlay-%s' % (name,)
+
+def parse_pool(text, version=None, mask=MaskKind.NONE):
+    # NAME,source=KIND[:ARG][,version=V][,shm=RING|,stream=PATH], where KIND
+    # is xbee or rs485 with a timeshark.cfg style config file, timeline with
+    # the name of a benchmark timeline to loop, or feed with the address of a
+    # network state feed.
+    parts = text.split(',')
+    name = parts[0]
+    if not name:
+        raise ValueError("pool needs a name: %s" % (text,))
+    options = {}
+    for part in parts[1:]:
+        key, sep, value = part.partition('=')
+        if not sep or key not in ('source', 'version', 'shm', 'stream'):
+            raise ValueError("bad pool option %r in %s" % (part, text))
+        options[key] = value
+    if 'shm' in options and 'stream' in options:
+        raise ValueError("pool %s can't have both shm and stream" % (name,))
+
+    kind, _, arg = options.get('source', '').partition(':')
+    if kind not in SOURCES:
+        raise ValueError("pool %s needs source=xbee:CFG, rs485:CFG, timeline:NAME or "
+                         "feed:ADDRESS" % (name,))
+    if kind == 'timeline':
+        if arg not in dict(TIMELINES):
+            raise ValueError("pool %s: no timeline %r" % (name, arg))
+    elif kind == 'feed':
+        parse_address(arg)
+    else:
+        arg = arg or 'timeshark.cfg'
+    version = options.get('version', version)
+    if version is not None and version not in OverlayPainter.versions():
+        raise ValueError("pool %s: no version %r" % (name, version))
+    return Pool(name, kind, arg, version, mask, options.get('shm'), options.get('stream'))
+
+def exit_with_parent(parent, poll=1.0):
+    # For processes that block in a render loop: go when the host does.
+    def watch():
+        while os.getppid() == parent:
+            time.sleep(poll)
+        os._exit(0)
+    threading.Thread(target=watch, name='parent-watch', daemon=True).start()
+
+def run_timeline(shared, name, fps=20, parent=None):
+    # State process for a scripted pool: loops a benchmark timeline in real
+    # time.
+    timeline = dict(TIMELINES)[name]
+    publisher = StatePublisher(shared)
+    scheduler = FrameScheduler(1 / fps)
+    while True:
+        mgr = make_manager(MOCK_TID)
+        for _ in timeline(mgr, fps * 10 * 60, fps):
+            if parent is not None and os.getppid() != parent:
+                return
+            scheduler.tick()
+            publisher.publish(mgr)
+            time.sleep(scheduler.delay())
+
+def run_pool(pool, shared, assets, options, parent):
+    # Render process for one pool. The host stops it with SIGTERM, which has
+    # to unwind for the ring to be unlinked.
+    exit_with_parent(parent)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    mgr = SharedGameManager(shared)
+    # Only ever from the store: until the host's first sync of a tournament
+    # lands, the pool shows placeholders, rather than every pool going to
+    # UWHScores for it at once.
+    scores = StoreScores(None, root=options['store'], refresh=options['follow_interval'],
+                         follow=True)
+    ov = HeadlessOverlay(mgr, pool.mask, pool.version, options['size'],
+                         uwhscores=scores, scale=options['scale'], assets=assets)
+    ov.warm_up()
+    if pool.shm is not None:
+        ring = FrameRing(pool.shm, ov.backend.size,
+                         FORMAT_FILL_KEY if pool.mask == MaskKind.LUMA else FORMAT_RGBA)
+        print("%s: writing %dx%d frames to %s" % (pool.name, ring.size[0], ring.size[1],
+                                                 ring.path))
+        try:
+            ov.run(ring.write, min_interval=options['min_interval'],
+                   max_interval=options['max_interval'])
+        finally:
+            ring.close()
+    else:
+        fmt = FORMATS[options['stream_format']](ov.backend.size, options['fps'])
+        with open(pool.stream, 'wb') as out:
+            PacedWriter(out, fmt).run(ov)
+
+class PoolHost(object):
+    def __init__(self, pools, uwhscores='https://uwhscores.com/api/v1/', store=None,
+                 refresh=60.0, prefetch=(), size=(1920, 1080), scale=1.0,
+                 min_interval=50, max_interval=1000, fps=30.0, stream_format='y4m',
+                 follow_interval=5.0):
+        self.pools = pools
+        self.fetcher = ScoresFetcher(uwhscores)
+        # Prefetching is synchronous, and nothing refreshes in the background
+        # until after the fork: run() does that from this thread.
+        self.scores = StoreScores(self.fetcher, root=store, refresh=0)
+        self.refresh = refresh
+        self.prefetch = list(prefetch)
+        self.options = {
+            'store' : self.scores.root,
+            'size' : size,
+            'scale' : scale,
+            'min_interval' : min_interval,
+            'max_interval' : max_interval,
+            'fps' : fps,
+            'stream_format' : stream_format,
+            'follow_interval' : follow_interval,
+        }
+        self.context = multiprocessing.get_context('fork')
+        self.states = {}
+        self.processes = []
+
+    def start(self):
+        for tid in self.prefetch:
+            self.scores.prefetch(tid)
+
+        # Scaled to every size the pools draw them at, so the render processes
+        # share those too rather than each resampling its own.
+        assets = AssetCache(capacity=64, scale=self.options['scale'])
+        start = time.monotonic()
+        assets.preload([asset for pool in self.pools
+                        for asset in startup_assets(pool.version, pool.mask, self.options['size'])])
+        print("Decoded and scaled %d images in %.1fs" % (len(assets), time.monotonic() - start))
+
+        # Ctrl-C is for the host, which then stops the pools with terminate().
+        parent = os.getpid()
+        interrupt = signal.signal(signal.SIGINT, signal.SIG_IGN)
+        for pool in self.pools:
+            shared = SharedGameState()
+            if pool.source == 'timeline':
+                state = self.context.Process(target=run_timeline, name='%s-state' % (pool.name,),
+                                             args=(shared, pool.config, 20, parent), daemon=True)
+            elif pool.source == 'feed':
+                state = self.context.Process(target=run_feed, name='%s-feed' % (pool.name,),
+                                             args=(shared, pool.config, 0.01, parent), daemon=True)
+            else:
+                state = self.context.Process(target=run_comms, name='%s-comms' % (pool.name,),
+                                             args=(shared, pool.source, pool.config, 0.01, parent),
+                                             daemon=True)
+            render = self.context.Process(target=run_pool, name='%s-render' % (pool.name,),
+                                          args=(pool, shared, assets, self.options, parent),
+                                          daemon=True)
+            state.start()
+            render.start()
+            self.states[pool.name] = SharedGameManager(shared)
+            self.processes += [state, render]
+            print("Pool %s: %s %s, render process %d" % (pool.name, pool.source, pool.config,
+                                                         render.pid))
+        signal.signal(signal.SIGINT, interrupt)
+
+    def tournaments(self):
+        # Every tournament a pool is showing or was asked to prefetch.
+        tids = set(self.prefetch)
+        for mgr in self.states.values():
+            mgr.update()
+            if mgr.tid() is not None:
+                tids.add(mgr.tid())
+        return sorted(tids)
+
+    def run(self, poll=1.0):
+        last_sync = {}
+        exited = set()
+        while True:
+            for p in self.processes:
+                if p.exitcode is not None and p.name not in exited:
+                    print("%s exited with %s" % (p.name, p.exitcode))
+                    exited.add(p.name)
+            now = time.monotonic()
+            for tid in self.tournaments():
+                if tid in last_sync and (not self.refresh or now - last_sync[tid] < self.refresh):
+                    continue
+                last_sync[tid] = now
+                try:
+                    self.scores.store(tid).sync(self.fetcher)
+                except Exception as e:
+                    print("Syncing tournament %s failed: %s" % (tid, e))
+            time.sleep(poll)
+
+    def stop(self):
+        for p in self.processes:
+            if p.is_alive():
+                p.terminate()
+        for p in self.processes:
+            p.join(5)
+        self.fetcher.close()
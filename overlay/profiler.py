@@ -0,0 +1,150 @@
+import time
+from collections import deque
+
+class _NullStage(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class NullProfiler(object):
+    # Stands in when profiling is off: stage() hands back one shared no-op
+    # context manager, so instrumented code pays for a method call and nothing
+    # else.
+    enabled = False
+    _stage = _NullStage()
+
+    def stage(self, name):
+        return self._stage
+
+    def record(self, name, seconds):
+        pass
+
+    def attach(self, reporter):
+        pass
+
+    def frame_done(self):
+        pass
+
+    def close(self):
+        pass
+
+class _Stage(object):
+    __slots__ = ('samples', 'start')
+
+    def __init__(self, samples):
+        self.samples = samples
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.samples.append(time.perf_counter() - self.start)
+        return False
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+class Profiler(object):
+    # Times named stages with a monotonic clock, keeping the last `window`
+    # samples of each. The summary is written to `path` every `dump_interval`
+    # seconds and once more on close().
+    enabled = True
+
+    def __init__(self, path=None, window=2000, dump_interval=30.0):
+        self.path = path
+        self.window = window
+        self.dump_interval = dump_interval
+        self.samples = {}
+        self.counts = {}
+        self.reporters = []
+        self.frames = 0
+        self.started = time.monotonic()
+        self.last_dump = self.started
+
+    def _samples(self, name):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        return samples
+
+    def stage(self, name):
+        self.counts[name] = self.counts.get(name, 0) + 1
+        return _Stage(self._samples(name))
+
+    def record(self, name, seconds):
+        self.counts[name] = self.counts.get(name, 0) + 1
+        self._samples(name).append(seconds)
+
+    def attach(self, reporter):
+        # Anything with a summary() to include in ours, e.g. a FrameScheduler.
+        self.reporters.append(reporter)
+
+    def frame_done(self):
+        self.frames += 1
+        now = time.monotonic()
+        if self.path is not None and now - self.last_dump >= self.dump_interval:
+            self.last_dump = now
+            self.dump()
+
+    def summary(self):
+        elapsed = time.monotonic() - self.started
+        lines = ["%d frames in %.1fs (%.1f fps)" % (self.frames, elapsed,
+                                                    self.frames / elapsed if elapsed else 0),
+                 "%-20s %8s %9s %9s %9s %9s" % ("stage", "count", "p50 ms",
+                                               "p95 ms", "p99 ms", "max ms")]
+        for name in sorted(self.samples):
+            ordered = sorted(self.samples[name])
+            lines.append("%-20s %8d %9.3f %9.3f %9.3f %9.3f" % (
+                name, self.counts[name],
+                percentile(ordered, 50) * 1000,
+                percentile(ordered, 95) * 1000,
+                percentile(ordered, 99) * 1000,
+                (ordered[-1] if ordered else 0) * 1000))
+        lines.extend(reporter.summary() for reporter in self.reporters)
+        return "\n".join(lines)
+
+    def dump(self):
+        with open(self.path, 'w') as f:
+            f.write(self.summary() + "\n")
+
+    def close(self):
+        print(self.summary())
+        if self.path is not None:
+            self.dump()
+
+class StartupTimer(object):
+    # How long after `started` (a time.monotonic(), by default when this was
+    # made) the first frame went out, and the first one showing the whole
+    # game: names, rosters and flags from UWHScores. With `report` each is
+    # printed once it happens; summary() has both, for the profiler's report.
+    def __init__(self, started=None, report=False):
+        self.started = time.monotonic() if started is None else started
+        self.report = report
+        self.warm_up = None
+        self.first_frame = None
+        self.first_full_frame = None
+
+    def frame(self, full):
+        elapsed = time.monotonic() - self.started
+        if self.first_frame is None:
+            self.first_frame = elapsed
+            if self.report:
+                print("First frame after %.0f ms" % (elapsed * 1000,))
+        if full and self.first_full_frame is None:
+            self.first_full_frame = elapsed
+            if self.report:
+                print("First frame with full game data after %.0f ms" % (elapsed * 1000,))
+
+    def summary(self):
+        def ms(seconds):
+            return "-" if seconds is None else "%.0f ms" % (seconds * 1000,)
+        return "startup: warm-up %s, first frame %s, first full data frame %s" % (
+            ms(self.warm_up), ms(self.first_frame), ms(self.first_full_frame))
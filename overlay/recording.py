@@ -0,0 +1,291 @@
+import bisect
+import struct
+import threading
+import time
+from overlay.netfeed import (FULL, DELTA, EMPTY, FieldsGameManager, read_fields, encode_field,
+                             decode_field)
+
+# Recordings of what a GameManager showed during a game, for replaying into the
+# overlay later: to regenerate graphics, or as a real workload to benchmark.
+#
+# A recording is a 16 byte header:
+#
+#   0   8s  magic, b'UWHREC01'
+#   8   d   time.time() when recording started
+#
+# followed by records, only ever appended to:
+#
+#   0   I   milliseconds since the start
+#   4   B   kind: FULL, or DELTA for one holding only what changed since the
+#           record before it
+#   5   H   length of the fields that follow
+#
+# The fields are encoded as in the network feed (overlay/netfeed.py). A FULL
+# record is written for the first change after every `keyframe` seconds. A
+# record that was cut short at the end, e.g. by a crash, is ignored, and one
+# whose fields don't decode is skipped along with the DELTAs after it, until
+# the next FULL. Records carry no sync marker, though, so a damaged length
+# loses everything after it.
+
+MAGIC = b'UWHREC01'
+FILE_HEADER = struct.Struct('<8sd')
+RECORD = struct.Struct('<IBH')
+
+class Recorder(object):
+    # Call record(mgr) as often as changes should be noticed; only changes are
+    # written. Recording to an existing file carries on after what's in it.
+    def __init__(self, path, keyframe=10.0):
+        self.path = path
+        self.keyframe = keyframe
+        self.file = open(path, 'ab')
+        if self.file.tell() == 0:
+            self.started = time.time()
+            self.file.write(FILE_HEADER.pack(MAGIC, self.started))
+            self.file.flush()
+        else:
+            with open(path, 'rb') as f:
+                magic, self.started = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+            if magic != MAGIC:
+                self.file.close()
+                raise ValueError("%s is not a game recording" % (path,))
+        self._origin = time.monotonic() - (time.time() - self.started)
+        self._values = None
+        self._full_at = None
+        self.records = 0
+        self.bytes = 0
+
+    def record(self, mgr, at=None):
+        # `at` is seconds since the start of the recording, for writing one
+        # out faster than real time. Returns whether anything was written.
+        values = read_fields(mgr)
+        if values == self._values:
+            return False
+        now = time.monotonic() - self._origin if at is None else at
+        if self._values is None or now - self._full_at >= self.keyframe:
+            kind = FULL
+            fields = range(len(values))
+            self._full_at = now
+        else:
+            kind = DELTA
+            fields = [f for f, v in enumerate(values) if v != self._values[f]]
+        self._values = values
+
+        payload = b''.join(encode_field(f, values[f]) for f in fields)
+        record = RECORD.pack(int(round(now * 1000)), kind, len(payload)) + payload
+        self.file.write(record)
+        self.file.flush()
+        self.records += 1
+        self.bytes += len(record)
+        return True
+
+    def record_thread(self, mgr, interval=0.01):
+        # For a GameManager updated by a listener thread in this process.
+        def run():
+            while True:
+                self.record(mgr)
+                time.sleep(interval)
+        threading.Thread(target=run, name='recorder', daemon=True).start()
+
+    def close(self):
+        self.file.close()
+
+class Recording(object):
+    # A whole recording, decoded: the state after every record, and when.
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        if len(data) < FILE_HEADER.size:
+            raise ValueError("%s is not a game recording" % (path,))
+        magic, self.started = FILE_HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("%s is not a game recording" % (path,))
+
+        self.path = path
+        self.bytes = len(data)
+        self.times = []
+        self.states = []
+        self.full = 0
+        self.skipped = 0
+        self.truncated = False
+        values = None
+        offset = FILE_HEADER.size
+        while offset < len(data):
+            if offset + RECORD.size > len(data):
+                self.truncated = True
+                break
+            t, kind, length = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            end = offset + length
+            if end > len(data):
+                self.truncated = True
+                break
+            if kind == FULL:
+                decoded = list(EMPTY)
+            elif values is not None:
+                decoded = list(values)
+            else:
+                self.skipped += 1
+                offset = end
+                continue
+            try:
+                field_offset = offset
+                while field_offset < end:
+                    field_offset = decode_field(data, field_offset, decoded)
+            except (struct.error, IndexError):
+                # Damaged: wait for the next FULL record.
+                self.skipped += 1
+                values = None
+                offset = end
+                continue
+            offset = end
+            values = decoded
+            if kind == FULL:
+                self.full += 1
+            # Wall clock steps between sessions mustn't send time backwards.
+            if self.times and t < self.times[-1]:
+                t = self.times[-1]
+            self.times.append(t)
+            self.states.append(values)
+
+    @property
+    def duration(self):
+        return self.times[-1] / 1000 if self.times else 0.0
+
+    def summary(self):
+        return "%s: %d records (%d full), %.1fs, %d bytes%s%s" % (
+            self.path, len(self.times), self.full, self.duration, self.bytes,
+            ", %d damaged records skipped" % (self.skipped,) if self.skipped else "",
+            ", cut short at the end" if self.truncated else "")
+
+class ReplayGameManager(FieldsGameManager):
+    # GameManager stand-in playing a Recording back. With speed > 0 the
+    # painter's update() each tick moves it along the wall clock, `speed`
+    # times real time; with speed 0 it stays put between seek()s, for
+    # rendering as fast as possible.
+    def __init__(self, recording, speed=1.0, loop=False, start=0.0):
+        FieldsGameManager.__init__(self)
+        self.recording = recording
+        self.speed = speed
+        self.loop = loop
+        self.position = 0.0
+        self._index = None
+        self._origin = None
+        self.seek(start)
+
+    def seek(self, t):
+        # Show the game as it was `t` seconds into the recording. Returns
+        # whether that changed anything.
+        if self.loop and self.recording.duration:
+            t %= self.recording.duration
+        self.position = t
+        i = bisect.bisect_right(self.recording.times, int(round(t * 1000))) - 1
+        if i == self._index:
+            return False
+        self._index = i
+        self.adopt(self.recording.states[i] if i >= 0 else EMPTY)
+        return True
+
+    def update(self):
+        if not self.speed:
+            return False
+        now = time.monotonic()
+        if self._origin is None:
+            self._origin = now - self.position / self.speed
+        return self.seek((now - self._origin) * self.speed)
+
+    def finished(self):
+        return not self.loop and self.position >= self.recording.duration
+
+def record_timeline(path, name, frames, fps):
+    # A recording of a benchmark timeline, written as fast as it plays.
+    from overlay.bench import TIMELINES, MOCK_TID, make_manager
+    recorder = Recorder(path)
+    mgr = make_manager(MOCK_TID)
+    for i, _ in enumerate(dict(TIMELINES)[name](mgr, frames, fps)):
+        recorder.record(mgr, at=i / fps)
+    recorder.close()
+    return recorder
+
+def main(argv=None):
+    import argparse
+    from overlay.bench import TIMELINES
+    from overlay.netfeed import FeedGameManager, FeedSender, DEFAULT_ADDRESS, parse_address
+    from overlay.scheduler import FrameScheduler
+    from overlay.sharedstate import start_listener
+    from uwh.gamemanager import GameManager
+
+    parser = argparse.ArgumentParser(description='Record game state, or look at or replay a recording')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    rec = commands.add_parser('record', help='Record from an XBee or RS485 link, a network '
+                              'feed, or a benchmark timeline')
+    rec.add_argument('recording')
+    source = rec.add_mutually_exclusive_group(required=True)
+    source.add_argument('--xbee', action='store_const', const='xbee', dest='link')
+    source.add_argument('--rs485', action='store_const', const='rs485', dest='link')
+    source.add_argument('--feed', metavar='ADDRESS', help='A network state feed')
+    source.add_argument('--timeline', choices=[name for name, _ in TIMELINES],
+                        help='Write out a benchmark timeline, --frames long at --fps')
+    rec.add_argument('--config', default='timeshark.cfg')
+    rec.add_argument('--duration', type=float, default=None, help='Seconds to record for')
+    rec.add_argument('--frames', type=int, default=3600)
+    rec.add_argument('--fps', type=int, default=20)
+
+    info = commands.add_parser('info', help='Summarise a recording')
+    info.add_argument('recording')
+
+    rep = commands.add_parser('replay', help='Play a recording into a network state feed')
+    rep.add_argument('recording')
+    rep.add_argument('address', nargs='?', default=DEFAULT_ADDRESS)
+    rep.add_argument('--speed', type=float, default=1.0, help='Times real time')
+    rep.add_argument('--loop', action='store_true')
+    rep.add_argument('--rate', type=float, default=50.0, help='Updates a second')
+    args = parser.parse_args(argv)
+    if args.command == 'replay' and args.speed <= 0:
+        parser.error('--speed must be above 0')
+
+    try:
+        if args.command == 'info':
+            print(Recording(args.recording).summary())
+        elif args.command == 'record' and args.timeline is not None:
+            record_timeline(args.recording, args.timeline, args.frames, args.fps)
+            print(Recording(args.recording).summary())
+        elif args.command == 'record':
+            if args.feed is not None:
+                mgr = FeedGameManager(args.feed)
+                mgr.listen_thread()
+            else:
+                mgr = GameManager()
+                mgr.setPassive()
+                start_listener(mgr, args.link, args.config)
+            recorder = Recorder(args.recording)
+            end = None if args.duration is None else time.monotonic() + args.duration
+            try:
+                while end is None or time.monotonic() < end:
+                    if args.feed is not None:
+                        mgr.update()
+                    recorder.record(mgr)
+                    time.sleep(0.01)
+            except KeyboardInterrupt:
+                pass
+            recorder.close()
+            print(Recording(args.recording).summary())
+        else:
+            parse_address(args.address)
+            mgr = ReplayGameManager(Recording(args.recording), args.speed, args.loop)
+            sender = FeedSender(args.address)
+            scheduler = FrameScheduler(1 / args.rate)
+            try:
+                while not mgr.finished():
+                    scheduler.tick()
+                    mgr.update()
+                    sender.send(mgr)
+                    time.sleep(scheduler.delay())
+            except KeyboardInterrupt:
+                pass
+            print("%d packets (%d full), %d bytes" % (sender.sent, sender.full, sender.bytes))
+    except (OSError, ValueError) as e:
+        print("%s: %s" % (args.recording, e))
+        return 1
+    return 0
@@ -0,0 +1,112 @@
+from collections import namedtuple
+
+FrameStats = namedtuple('FrameStats', ['created', 'mutated', 'deleted', 'items'])
+
+class Scene(object):
+    # Retained canvas items.
+    #
+    # Every frame issues the same sequence of drawing calls as the one before
+    # it, so the n-th call of a frame is matched against the n-th item of the
+    # previous frame. When the kinds line up the existing item is kept, and only
+    # its coords or the options that actually differ are pushed to Tk. Anything
+    # left over at the end of the frame is deleted.
+    def __init__(self, canvas):
+        self.canvas = canvas
+        self._items = []
+        self._next = 0
+        self._restack = False
+        self._created = 0
+        self._mutated = 0
+        self._deleted = 0
+        self.stats = FrameStats(0, 0, 0, 0)
+
+    def begin(self):
+        self._next = 0
+        self._restack = False
+        self._created = 0
+        self._mutated = 0
+        self._deleted = 0
+
+    def end(self):
+        for item in self._items[self._next:]:
+            self.canvas.delete(item[1])
+            self._deleted += 1
+        del self._items[self._next:]
+        self.stats = FrameStats(self._created, self._mutated, self._deleted,
+                                len(self._items))
+        return self.stats
+
+    def reset(self):
+        self.begin()
+        self.end()
+
+    def arc(self, bbox, **options):
+        return self._item('arc', bbox, options)
+
+    def rectangle(self, bbox, **options):
+        return self._item('rectangle', bbox, options)
+
+    def oval(self, bbox, **options):
+        return self._item('oval', bbox, options)
+
+    def text(self, xy, **options):
+        return self._item('text', xy, options)
+
+    def image(self, xy, **options):
+        return self._item('image', xy, options)
+
+    def _item(self, kind, coords, options):
+        coords = tuple(coords)
+        idx = self._next
+        self._next += 1
+
+        if idx < len(self._items):
+            item = self._items[idx]
+            if item[0] == kind and item[3].keys() == options.keys():
+                self._update(item, coords, options)
+                return item[1]
+
+            # The layout changed shape here: replace the item, and re-raise
+            # everything that follows so the stacking order still matches the
+            # drawing order.
+            self.canvas.delete(item[1])
+            self._deleted += 1
+            self._restack = True
+            item[:] = [kind, self._create(kind, coords, options), coords, options]
+            return item[1]
+
+        item = [kind, self._create(kind, coords, options), coords, options]
+        self._items.append(item)
+        return item[1]
+
+    def _create(self, kind, coords, options):
+        self._created += 1
+        return getattr(self.canvas, 'create_' + kind)(*coords, **options)
+
+    def _update(self, item, coords, options):
+        ident = item[1]
+        changed = False
+
+        if self._restack:
+            self.canvas.tag_raise(ident)
+
+        if item[2] != coords:
+            self.canvas.coords(ident, *coords)
+            item[2] = coords
+            changed = True
+
+        old = item[3]
+        diff = {}
+        for key, value in options.items():
+            if old[key] != value:
+                # Tkinter silently drops None options, so spell out the reset.
+                diff[key] = '' if value is None else value
+        if diff:
+            self.canvas.itemconfigure(ident, **diff)
+            changed = True
+        # Keep a reference to the latest options even when nothing changed:
+        # it is what holds on to the PhotoImages the canvas is showing.
+        item[3] = options
+
+        if changed:
+            self._mutated += 1
@@ -0,0 +1,51 @@
+import math
+import time
+
+class FrameScheduler(object):
+    # Frame slots on absolute deadlines, start + k * interval on the monotonic
+    # clock, so render time and stalls don't push every later frame back.
+    #
+    # Call tick() as a frame starts and wait delay() before the next one. A
+    # frame that starts within `tolerance` of its deadline is on time, later
+    # than that it's late. Deadlines that passed entirely while an earlier
+    # frame was still running are dropped, not run back to back to catch up.
+    def __init__(self, interval, tolerance=None, clock=time.monotonic):
+        self.interval = interval
+        self.tolerance = interval / 4 if tolerance is None else tolerance
+        self.clock = clock
+        self.deadline = None
+        self.on_time = 0
+        self.late = 0
+        self.dropped = 0
+
+    def tick(self):
+        # Returns how late this frame started, in seconds.
+        now = self.clock()
+        if self.deadline is None:
+            self.deadline = now
+        lateness = now - self.deadline
+        if lateness >= self.interval:
+            missed = int(math.floor(lateness / self.interval))
+            self.dropped += missed
+            self.deadline += missed * self.interval
+            lateness -= missed * self.interval
+        if lateness <= self.tolerance:
+            self.on_time += 1
+        else:
+            self.late += 1
+        self.deadline += self.interval
+        return max(0.0, lateness)
+
+    def delay(self):
+        # Seconds from now until the next frame is due.
+        return max(0.0, self.deadline - self.clock())
+
+    def delay_ms(self):
+        # For tk's after(), which wants whole milliseconds.
+        return int(math.ceil(self.delay() * 1000))
+
+    def summary(self):
+        total = self.on_time + self.late + self.dropped
+        return "%d frame slots at %.0f ms: %d on time, %d late, %d dropped (%.1f%% on time)" % (
+            total, self.interval * 1000, self.on_time, self.late, self.dropped,
+            self.on_time * 100 / total if total else 100.0)
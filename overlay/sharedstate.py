@@ -0,0 +1,275 @@
+import multiprocessing
+import os
+import struct
+import time
+import zlib
+from uwh.gamemanager import GameManager, TeamColor
+
+# The game as the comms process sees it, published into a block of shared
+# memory for the overlay process to read without locks.
+#
+# The block is a 16 byte header followed by the state:
+#
+#   0   Q   sequence: odd while the state is being written
+#   8   I   CRC-32 of the state
+#   12  I   length of the state in bytes
+#
+# The state is STATE, then `penalties` PENALTY records and `goals` GOAL
+# records. A reader copies it out between two reads of the sequence and
+# keeps the copy only if the sequence didn't move and the CRC matches; the
+# CRC also covers stores landing out of order on weakly ordered CPUs, which
+# CPython has no fences for.
+
+MAX_PENALTIES = 32
+# The latest goals only; the overlay never shows older ones.
+MAX_GOALS = 64
+
+HEADER = struct.Struct('<QII')
+SEQUENCE = struct.Struct('<Q')
+# game state, timeout state, game clock, clock at pause, black score,
+# white score, layout, tid, gid, goals ever scored, penalties, goals
+STATE = struct.Struct('<iiqqiiiqqIII')
+# player, team, dismissed, seconds remaining, served completely
+PENALTY = struct.Struct('<iiBqB')
+# goal number, player, team, time, game state
+GOAL = struct.Struct('<iiiqi')
+
+BLOCK_SIZE = HEADER.size + STATE.size + MAX_PENALTIES * PENALTY.size + MAX_GOALS * GOAL.size
+
+NONE_ID = -1
+
+def encode(mgr):
+    penalties = mgr.penalties(TeamColor.white) + mgr.penalties(TeamColor.black)
+    penalties = penalties[:MAX_PENALTIES]
+    goals = mgr.goals()
+    shown = goals[-MAX_GOALS:]
+    parts = [STATE.pack(mgr.gameState(), mgr.timeoutState(),
+                        int(mgr.gameClock()), int(mgr.gameClockAtPause()),
+                        mgr.blackScore(), mgr.whiteScore(), mgr.layout(),
+                        NONE_ID if mgr.tid() is None else mgr.tid(),
+                        NONE_ID if mgr.gid() is None else mgr.gid(),
+                        len(goals), len(penalties), len(shown))]
+    for p in penalties:
+        parts.append(PENALTY.pack(p.player(), p.team(), bool(p.dismissed()),
+                                  int(p.timeRemaining(mgr)), bool(p.servedCompletely(mgr))))
+    for g in shown:
+        parts.append(GOAL.pack(g.goal_no(), g.player(), g.team(), int(g.time()), g.state()))
+    return b''.join(parts)
+
+class SharedGameState(object):
+    # The block itself. Made before the comms process starts, which inherits
+    # it.
+    def __init__(self):
+        self.array = multiprocessing.RawArray('B', BLOCK_SIZE)
+        self.view = memoryview(self.array).cast('B')
+
+class StatePublisher(object):
+    # Writing side, in the comms process.
+    def __init__(self, shared):
+        self.view = shared.view
+        self.sequence = 0
+        self.published = None
+
+    def publish(self, mgr):
+        # Returns whether anything changed since the last publish.
+        state = encode(mgr)
+        if state == self.published:
+            return False
+        self.sequence += 1
+        SEQUENCE.pack_into(self.view, 0, self.sequence)
+        HEADER.pack_into(self.view, 0, self.sequence, zlib.crc32(state), len(state))
+        self.view[HEADER.size:HEADER.size + len(state)] = state
+        self.sequence += 1
+        SEQUENCE.pack_into(self.view, 0, self.sequence)
+        self.published = state
+        return True
+
+class SharedPenalty(object):
+    __slots__ = ('_player', '_team', '_dismissed', '_remaining', '_served')
+
+    def __init__(self, player, team, dismissed, remaining, served):
+        self._player = player
+        self._team = team
+        self._dismissed = bool(dismissed)
+        self._remaining = remaining
+        self._served = bool(served)
+
+    def player(self):
+        return self._player
+
+    def team(self):
+        return self._team
+
+    def dismissed(self):
+        return self._dismissed
+
+    def timeRemaining(self, mgr):
+        return self._remaining
+
+    def servedCompletely(self, mgr):
+        return self._served
+
+class SharedGoal(object):
+    __slots__ = ('_goal_no', '_player', '_team', '_time', '_state')
+
+    def __init__(self, goal_no, player, team, time, state):
+        self._goal_no = goal_no
+        self._player = player
+        self._team = team
+        self._time = time
+        self._state = state
+
+    def goal_no(self):
+        return self._goal_no
+
+    def player(self):
+        return self._player
+
+    def team(self):
+        return self._team
+
+    def time(self):
+        return self._time
+
+    def state(self):
+        return self._state
+
+class ReadOnlyGameManager(object):
+    # The GameManager calls the overlay makes, answered from a copy of the
+    # state laid out as STATE, with the penalties by team and the goals.
+    # Subclasses fill it in; the painter calls update() once a tick for them
+    # to copy in a newer one, so a frame never sees two states.
+    def __init__(self):
+        self._state = (0, 0, 0, 0, 0, 0, 0, NONE_ID, NONE_ID, 0, 0, 0)
+        self._penalties = {}
+        self._goals = []
+
+    def update(self):
+        # Returns whether the state changed.
+        return False
+
+    def gameState(self):
+        return self._state[0]
+
+    def timeoutState(self):
+        return self._state[1]
+
+    def gameClock(self):
+        return self._state[2]
+
+    def gameClockAtPause(self):
+        return self._state[3]
+
+    def blackScore(self):
+        return self._state[4]
+
+    def whiteScore(self):
+        return self._state[5]
+
+    def layout(self):
+        return self._state[6]
+
+    def tid(self):
+        return None if self._state[7] == NONE_ID else self._state[7]
+
+    def gid(self):
+        return None if self._state[8] == NONE_ID else self._state[8]
+
+    def penalties(self, team):
+        return list(self._penalties.get(team, ()))
+
+    def goals(self):
+        return list(self._goals)
+
+class SharedGameManager(ReadOnlyGameManager):
+    # Reading side, in the overlay process: answers from the last state it
+    # copied out of the block, which update() copies again.
+    def __init__(self, shared):
+        ReadOnlyGameManager.__init__(self)
+        self.view = shared.view
+        self.sequence = None
+        self.torn = 0
+        self.update()
+
+    def update(self, retries=4):
+        # Returns whether the state changed.
+        view = self.view
+        for _ in range(retries):
+            before, crc, length = HEADER.unpack_from(view, 0)
+            if before == self.sequence:
+                return False
+            if before % 2 or length == 0:
+                continue
+            state = bytes(view[HEADER.size:HEADER.size + length])
+            if SEQUENCE.unpack_from(view, 0)[0] != before or zlib.crc32(state) != crc:
+                self.torn += 1
+                continue
+            self._load(state)
+            self.sequence = before
+            return True
+        return False
+
+    def _load(self, state):
+        self._state = STATE.unpack_from(state, 0)
+        penalty_count, goal_count = self._state[10], self._state[11]
+        offset = STATE.size
+        penalties = {}
+        for _ in range(penalty_count):
+            p = SharedPenalty(*PENALTY.unpack_from(state, offset))
+            penalties.setdefault(p.team(), []).append(p)
+            offset += PENALTY.size
+        goals = []
+        for _ in range(goal_count):
+            goals.append(SharedGoal(*GOAL.unpack_from(state, offset)))
+            offset += GOAL.size
+        self._penalties = penalties
+        self._goals = goals
+
+def start_listener(mgr, kind, config):
+    # Feed `mgr` from the XBee or RS485 link set up in `config`, on a thread.
+    from uwh.xbee_comms import XBeeClient, XBeeConfigParser, xbee_port, xbee_baud, xbee_id, xbee_ch
+    import uwh.rs485_comms as rs485_ser
+    import socket
+
+    cfg = XBeeConfigParser()
+    cfg.read(config)
+    if kind == 'xbee':
+        xbee = XBeeClient(mgr, xbee_port(cfg), xbee_baud(cfg))
+        xbee.setup(xbee_id(cfg), xbee_ch(cfg), socket.gethostname())
+        xbee.listen_thread()
+    else:
+        ser = rs485_ser.RS485Client(mgr, rs485_ser.port(cfg), rs485_ser.baud(cfg))
+        ser.listen_thread()
+
+def run_comms(shared, kind, config, interval=0.01, parent=None, record=None):
+    # Body of the comms process: a GameManager fed by the XBee or RS485
+    # listener, published every `interval` seconds whenever it changed, and
+    # written to the recording at `record` if there is one. Exits when the
+    # overlay process goes away.
+    mgr = GameManager()
+    mgr.setPassive()
+    start_listener(mgr, kind, config)
+    recorder = None
+    if record is not None:
+        from overlay.recording import Recorder
+        recorder = Recorder(record)
+    publish_loop(shared, mgr, interval, parent, recorder)
+
+def publish_loop(shared, mgr, interval=0.01, parent=None, recorder=None):
+    publisher = StatePublisher(shared)
+    deadline = time.monotonic()
+    while parent is None or os.getppid() == parent:
+        if publisher.publish(mgr) and recorder is not None:
+            recorder.record(mgr)
+        deadline += interval
+        time.sleep(max(0, deadline - time.monotonic()))
+
+def start_comms(kind, config='timeshark.cfg', interval=0.01, record=None):
+    # Start the comms process. Returns it and the GameManager stand-in the
+    # overlay should draw from.
+    shared = SharedGameState()
+    process = multiprocessing.Process(target=run_comms, name='uwh-comms',
+                                      args=(shared, kind, config, interval, os.getpid(), record),
+                                      daemon=True)
+    process.start()
+    return process, SharedGameManager(shared)
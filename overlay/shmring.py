@@ -0,0 +1,259 @@
+import mmap
+import os
+import struct
+import tempfile
+import time
+import zlib
+from PIL import Image
+from overlay.profiler import percentile
+
+# A ring of finished frames in a shared memory file, for a compositor or
+# encoder on the same machine to pick up without screen capture.
+#
+# The file starts with a 64 byte header:
+#
+#   0   8s  magic, b'UWHRING1'
+#   8   I   width in pixels
+#   12  I   height in pixels
+#   16  I   format: FORMAT_RGBA, or FORMAT_FILL_KEY for an RGB fill
+#           (premultiplied by the key) followed by an 8 bit key of the same
+#           size
+#   20  I   number of slots
+#   24  I   slot stride in bytes
+#   28  I   offset of the first slot
+#   32  Q   frames published so far
+#
+# followed by the slots, each a 64 byte slot header and then the pixels:
+#
+#   0   Q   sequence: odd while the slot is being written, even once it's done
+#   8   Q   frame counter, starting at 0
+#   16  d   time.monotonic() when the frame was published
+#   24  I   width
+#   28  I   height
+#   32  I   format
+#   36  I   pixel bytes
+#
+# Frame n goes into slot n % slots. Its sequence is 2n + 1 while it's being
+# copied in and 2n + 2 once it's complete, after which the published count
+# becomes n + 1. Readers take the sequence before and after looking at the
+# pixels, and a frame is only intact if the two match and are even.
+
+MAGIC = b'UWHRING1'
+FORMAT_RGBA = 0
+FORMAT_FILL_KEY = 1
+
+HEADER = struct.Struct('<8sIIIIII')
+PUBLISHED = struct.Struct('<Q')
+PUBLISHED_OFFSET = 32
+HEADER_SIZE = 64
+
+SLOT = struct.Struct('<QQdIIII')
+SEQUENCE = struct.Struct('<Q')
+SLOT_HEADER_SIZE = 64
+
+PAGE = 4096
+
+def ring_path(name):
+    # Bare names live in /dev/shm where there is one.
+    if os.sep in name:
+        return name
+    root = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(root, name)
+
+def frame_bytes(size):
+    # RGBA and fill + key both come to four bytes a pixel.
+    return size[0] * size[1] * 4
+
+class FrameRing(object):
+    # The writing side. Creates (or replaces) the ring file at `path`.
+    def __init__(self, path, size, format=FORMAT_RGBA, slots=4):
+        self.path = ring_path(path)
+        self.size = (int(size[0]), int(size[1]))
+        self.format = format
+        self.slots = slots
+        self.payload = frame_bytes(self.size)
+        # Page aligned, so every frame starts on a page of its own.
+        self.stride = -(-(SLOT_HEADER_SIZE + self.payload) // PAGE) * PAGE
+        length = PAGE + self.stride * slots
+        self.published = 0
+
+        with open(self.path + '.tmp', 'w+b') as f:
+            f.truncate(length)
+            self.map = mmap.mmap(f.fileno(), length)
+        HEADER.pack_into(self.map, 0, MAGIC, self.size[0], self.size[1], format,
+                         slots, self.stride, PAGE)
+        PUBLISHED.pack_into(self.map, PUBLISHED_OFFSET, 0)
+        # Readers never see a half written header.
+        os.replace(self.path + '.tmp', self.path)
+
+    def write(self, frame):
+        # `frame` is an RGBA image, or a (fill, key) pair with FORMAT_FILL_KEY.
+        if self.format == FORMAT_FILL_KEY:
+            fill, key = frame
+            data = (fill.tobytes(), key.tobytes())
+        else:
+            data = (frame.tobytes(),)
+
+        n = self.published
+        offset = PAGE + (n % self.slots) * self.stride
+        SEQUENCE.pack_into(self.map, offset, 2 * n + 1)
+        start = offset + SLOT_HEADER_SIZE
+        for chunk in data:
+            self.map[start:start + len(chunk)] = chunk
+            start += len(chunk)
+        SLOT.pack_into(self.map, offset, 2 * n + 1, n, time.monotonic(),
+                       self.size[0], self.size[1], self.format, self.payload)
+        SEQUENCE.pack_into(self.map, offset, 2 * n + 2)
+        self.published = n + 1
+        PUBLISHED.pack_into(self.map, PUBLISHED_OFFSET, self.published)
+
+    def close(self, unlink=True):
+        self.map.close()
+        if unlink:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+class RingFrame(object):
+    # One frame as read from the ring. `data` is a view straight into shared
+    # memory, so the writer may come round and overwrite it: check intact()
+    # after using it, or take a copy().
+    __slots__ = ('reader', 'offset', 'sequence', 'counter', 'timestamp',
+                 'width', 'height', 'format', 'data')
+
+    def __init__(self, reader, offset, sequence, counter, timestamp,
+                 width, height, format, data):
+        self.reader = reader
+        self.offset = offset
+        self.sequence = sequence
+        self.counter = counter
+        self.timestamp = timestamp
+        self.width = width
+        self.height = height
+        self.format = format
+        self.data = data
+
+    def intact(self):
+        return SEQUENCE.unpack_from(self.reader.map, self.offset)[0] == self.sequence
+
+    def copy(self):
+        # The pixels as bytes, or None if the frame was overwritten meanwhile.
+        data = bytes(self.data)
+        return data if self.intact() else None
+
+    def image(self):
+        # An RGBA image, or a (fill, key) pair, or None if torn.
+        data = self.copy()
+        if data is None:
+            return None
+        size = (self.width, self.height)
+        if self.format == FORMAT_FILL_KEY:
+            split = self.width * self.height * 3
+            return (Image.frombytes('RGB', size, data[:split]),
+                    Image.frombytes('L', size, data[split:]))
+        return Image.frombytes('RGBA', size, data)
+
+class FrameRingReader(object):
+    # The reading side, for compositors, encoders and tests.
+    def __init__(self, path):
+        self.path = ring_path(path)
+        with open(self.path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self.map)
+        (magic, self.width, self.height, self.format, self.slots, self.stride,
+         self.first) = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError("%s is not a frame ring" % (self.path,))
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    def published(self):
+        return PUBLISHED.unpack_from(self.map, PUBLISHED_OFFSET)[0]
+
+    def read(self, counter=None):
+        # Frame `counter`, or the newest one. None if it hasn't been written
+        # yet, has already been overwritten, or is being written right now.
+        published = self.published()
+        if counter is None:
+            counter = published - 1
+        if counter < 0 or counter >= published or counter < published - self.slots:
+            return None
+        offset = self.first + (counter % self.slots) * self.stride
+        sequence, slot_counter, timestamp, width, height, format, length = \
+            SLOT.unpack_from(self.map, offset)
+        if sequence != 2 * counter + 2 or slot_counter != counter:
+            return None
+        start = offset + SLOT_HEADER_SIZE
+        return RingFrame(self, offset, sequence, counter, timestamp, width, height,
+                         format, self._view[start:start + length])
+
+    def close(self):
+        self._view.release()
+        self.map.close()
+
+def check(path, duration=10.0, poll=0.001, verbose=True):
+    # Follow a ring like a consumer would, touching every pixel of every frame
+    # it picks up, and count the frames that were skipped over (dropped) or
+    # changed underneath it (torn).
+    reader = FrameRingReader(path)
+    stats = {'frames' : 0, 'dropped' : 0, 'torn' : 0}
+    latencies = []
+    last = None
+    frame = None
+    end = time.monotonic() + duration
+    try:
+        while time.monotonic() < end:
+            published = reader.published()
+            if published == 0 or (last is not None and published - 1 == last):
+                time.sleep(poll)
+                continue
+            frame = reader.read(last + 1 if last is not None else None)
+            if frame is None:
+                # Lapped by the writer: jump to the newest frame.
+                frame = reader.read()
+                if frame is None:
+                    continue
+            zlib.crc32(frame.data)
+            received = time.monotonic()
+            if not frame.intact():
+                stats['torn'] += 1
+                last = frame.counter
+                continue
+            # The first frame may have been waiting since before we started.
+            if last is not None:
+                stats['dropped'] += frame.counter - last - 1
+                latencies.append(received - frame.timestamp)
+            stats['frames'] += 1
+            last = frame.counter
+    finally:
+        # The mapping can't be closed while a frame still looks into it.
+        frame = None
+        reader.close()
+
+    latencies.sort()
+    stats['latency_p50_ms'] = percentile(latencies, 50) * 1000
+    stats['latency_p99_ms'] = percentile(latencies, 99) * 1000
+    if verbose:
+        print("%(frames)d frames, %(dropped)d dropped, %(torn)d torn, "
+              "latency p50 %(latency_p50_ms).2f ms, p99 %(latency_p99_ms).2f ms" % stats)
+    return stats
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description='Read frames from an overlay frame ring and '
+                                     'check for dropped or torn frames')
+    parser.add_argument('ring', help='Ring name in /dev/shm, or a path')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='Seconds to follow the ring for')
+    args = parser.parse_args(argv)
+
+    try:
+        stats = check(args.ring, args.duration)
+    except (OSError, ValueError) as e:
+        print("Can't read frame ring %s: %s" % (args.ring, e))
+        return 1
+    return 1 if stats['torn'] else 0
@@ -0,0 +1,150 @@
+import time
+from uwh.gamemanager import GameState, TimeoutState, TeamColor, PoolLayout
+from overlay.netfeed import FieldsGameManager, read_fields
+from overlay.sharedstate import ReadOnlyGameManager
+
+OVERTIME = frozenset((GameState.pre_ot, GameState.ot_first, GameState.ot_half,
+                      GameState.ot_second))
+SUDDEN_DEATH = frozenset((GameState.pre_sudden_death, GameState.sudden_death))
+HIGHLIGHTED_TIMEOUTS = frozenset((TimeoutState.ref, TimeoutState.white, TimeoutState.black,
+                                  TimeoutState.penalty_shot))
+
+# How far into a game each state is, for telling which goals are recent.
+STATE_ORDER = {
+    GameState.pre_game :     0,
+    GameState.first_half :   1,
+    GameState.half_time :    2,
+    GameState.second_half :  3,
+    GameState.pre_ot :       4,
+    GameState.ot_first :     5,
+    GameState.ot_half :      6,
+    GameState.ot_second :    7,
+    GameState.pre_sudden_death : 8,
+    GameState.sudden_death : 9,
+    GameState.game_over :   10,
+}
+
+def settled(mgr, tries=4):
+    # A copy of a live GameManager. With --comms-thread its listener writes to
+    # it from another thread, and it has no lock to take, so read everything
+    # in one go and again, giving a writer caught halfway through an update
+    # the chance to finish it, until two reads agree. That narrows the window
+    # but can't close it: a writer stalled for all of the reads can still
+    # leave one frame with, say, a new score but not yet its goal, until the
+    # next frame.
+    values = read_fields(mgr)
+    for _ in range(tries):
+        time.sleep(0)
+        again = read_fields(mgr)
+        if again == values:
+            break
+        values = again
+    copy = FieldsGameManager()
+    copy.adopt(values)
+    return copy
+
+class PenaltySnapshot(object):
+    __slots__ = ('player', 'team', 'dismissed', 'remaining', 'served')
+
+    def __init__(self, penalty, mgr):
+        self.player = penalty.player()
+        self.team = penalty.team()
+        self.dismissed = penalty.dismissed()
+        self.remaining = penalty.timeRemaining(mgr)
+        self.served = penalty.servedCompletely(mgr)
+
+class GoalSnapshot(object):
+    __slots__ = ('goal_no', 'player', 'team', 'time', 'state')
+
+    def __init__(self, goal):
+        self.goal_no = goal.goal_no()
+        self.player = goal.player()
+        self.team = goal.team()
+        self.time = goal.time()
+        self.state = goal.state()
+
+class Team(object):
+    # One side of the screen: the GameManager's score and colour for it, and
+    # what UWHScores knows about the team playing in that colour.
+    __slots__ = ('color', 'score', 'id', 'name', 'roster')
+
+    def __init__(self, color, score, id, name, roster):
+        self.color = color
+        self.score = score
+        self.id = id
+        self.name = name
+        self.roster = roster
+
+class GameSnapshot(object):
+    # Everything a frame needs from the GameManager, read off it once at the
+    # start of the frame, while the comms thread keeps updating it. Rendering
+    # only looks here, so a frame can't mix two states of the game, and the
+    # questions the views keep asking are answered once. A live GameManager is
+    # read through settled() first.
+    __slots__ = ('game_state', 'timeout_state', 'game_clock', 'clock_at_pause',
+                 'black_score', 'white_score', 'layout', 'tid', 'gid',
+                 'penalties', 'goal_count', 'goal',
+                 'is_overtime', 'is_sudden_death', 'is_team_timeout', 'timeout_team',
+                 'highlight_timeout', 'white_on_left', 'key')
+
+    def __init__(self, mgr):
+        if not isinstance(mgr, ReadOnlyGameManager):
+            mgr = settled(mgr)
+        self.game_state = mgr.gameState()
+        self.timeout_state = mgr.timeoutState()
+        self.game_clock = mgr.gameClock()
+        self.clock_at_pause = mgr.gameClockAtPause()
+        self.black_score = mgr.blackScore()
+        self.white_score = mgr.whiteScore()
+        self.layout = mgr.layout()
+        self.tid = mgr.tid()
+        self.gid = mgr.gid()
+        self.penalties = tuple(PenaltySnapshot(p, mgr)
+                               for p in (mgr.penalties(TeamColor.white) +
+                                         mgr.penalties(TeamColor.black)))
+        goals = mgr.goals()
+
+        self.is_overtime = self.game_state in OVERTIME
+        self.is_sudden_death = self.game_state in SUDDEN_DEATH
+        self.timeout_team = {
+            TimeoutState.white : TeamColor.white,
+            TimeoutState.black : TeamColor.black,
+        }.get(self.timeout_state)
+        self.is_team_timeout = self.timeout_team is not None
+        self.highlight_timeout = (self.timeout_state in HIGHLIGHTED_TIMEOUTS or
+                                  self.is_overtime or self.is_sudden_death)
+        self.white_on_left = self.layout != PoolLayout.white_on_right
+
+        # The latest goal from this period or the one before, if any.
+        self.goal_count = len(goals)
+        state = STATE_ORDER[self.game_state]
+        recent = [g for g in goals if state - STATE_ORDER[g.state()] <= 1]
+        self.goal = None
+        if recent:
+            self.goal = GoalSnapshot(sorted(recent, key=lambda g: g.goal_no())[-1])
+
+        # Everything that changes what ends up on screen, down to the
+        # displayed second of the game and penalty clocks.
+        self.key = (self.game_state, self.timeout_state,
+                    self.game_clock, self.clock_at_pause,
+                    self.black_score, self.white_score,
+                    self.layout, self.tid, self.gid,
+                    self.goal_count,
+                    tuple((p.player, p.team, p.dismissed, p.remaining)
+                          for p in self.penalties))
+
+    def shown_penalties(self):
+        # Penalties still being served, soonest out first.
+        penalties = sorted(self.penalties, key=lambda p: p.player)
+        penalties.sort(key=lambda p: p.remaining)
+        return [p for p in penalties if not p.served]
+
+    def sides(self, data):
+        # (left, right) Teams, filled in from a GameData.
+        white = Team('white', self.white_score, data.white_id, data.white_name,
+                     data.white_roster)
+        black = Team('black', self.black_score, data.black_id, data.black_name,
+                     data.black_roster)
+        if self.white_on_left:
+            return white, black
+        return black, white
@@ -0,0 +1,314 @@
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+def default_store_dir():
+    return os.path.join(os.path.expanduser('~'), '.cache', 'uwh-overlay', 'uwhscores')
+
+class TournamentStore(object):
+    # A local copy of everything UWHScores knows about one tournament.
+    #
+    # <root>/<tid>/index.json holds the tournament, every game, every team's
+    # roster and the HTTP validators (ETag / Last-Modified) of each resource,
+    # in one compact JSON document. Flags sit next to it as raw image files.
+    # sync() brings it up to date with conditional requests, so resources that
+    # haven't changed cost a 304 and nothing else.
+    def __init__(self, root, tid):
+        self.root = root
+        self.tid = tid
+        self.dir = os.path.join(root, str(tid))
+        self._lock = threading.Lock()
+
+        self.tournament = None
+        self.games = {}
+        self.teams = {}
+        self.validators = {}
+
+        self.requests = 0
+        self.not_modified = 0
+        self._loaded = None
+        self.load()
+
+    @property
+    def index_path(self):
+        return os.path.join(self.dir, 'index.json')
+
+    def flag_path(self, team_id):
+        return os.path.join(self.dir, 'flags', str(team_id))
+
+    def complete(self):
+        return (self.tournament is not None and len(self.games) > 0 and
+                all(team_id in self.teams
+                    for g in self.games.values()
+                    for team_id in (g['black_id'], g['white_id'])
+                    # Bracket games whose teams aren't decided yet.
+                    if team_id is not None))
+
+    def load(self):
+        try:
+            loaded = os.stat(self.index_path).st_mtime_ns
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self._loaded = loaded
+        self.tournament = index.get('tournament')
+        self.games = {int(gid): g for gid, g in index.get('games', {}).items()}
+        self.teams = {int(team_id): t for team_id, t in index.get('teams', {}).items()}
+        self.validators = index.get('validators', {})
+        return True
+
+    def changed_on_disk(self):
+        # Whether another process saved the index since we last loaded it.
+        try:
+            return os.stat(self.index_path).st_mtime_ns != self._loaded
+        except OSError:
+            return False
+
+    def save(self):
+        with self._lock:
+            index = {
+                'tid' : self.tid,
+                'tournament' : self.tournament,
+                'games' : self.games,
+                'teams' : self.teams,
+                'validators' : self.validators,
+            }
+            os.makedirs(self.dir, exist_ok=True)
+            with open(self.index_path + '.tmp', 'w') as f:
+                json.dump(index, f, separators=(',', ':'))
+            os.replace(self.index_path + '.tmp', self.index_path)
+            try:
+                self._loaded = os.stat(self.index_path).st_mtime_ns
+            except OSError:
+                pass
+
+    def sync(self, fetcher, workers=8):
+        # Bring the store up to date. Returns whether anything changed.
+        base = fetcher.base_url
+        changed = False
+
+        body = self._get(fetcher, urljoin(base, 'tournaments/%s' % (self.tid,)))
+        if body is not None:
+            tournament = json.loads(body.decode('utf-8'))['tournament']
+            if tournament != self.tournament:
+                self.tournament = tournament
+                changed = True
+
+        # The games list carries every game in full, so one request covers
+        # them all.
+        body = self._get(fetcher, urljoin(base, 'tournaments/%s/games' % (self.tid,)))
+        games = self.games
+        if body is not None:
+            games = {g['gid']: g for g in json.loads(body.decode('utf-8'))['games']}
+            if games != self.games:
+                self.games = games
+                changed = True
+
+        team_ids = sorted(set(team_id for g in games.values()
+                              for team_id in (g['black_id'], g['white_id'])
+                              if team_id is not None))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            teams = dict(self.teams)
+            for team_id, team in zip(team_ids, pool.map(lambda t: self._sync_team(fetcher, t), team_ids)):
+                if team is not None and team != teams.get(team_id):
+                    teams[team_id] = team
+                    changed = True
+            self.teams = teams
+
+        self.save()
+        return changed
+
+    def _sync_team(self, fetcher, team_id):
+        url = urljoin(fetcher.base_url, 'tournaments/%s/teams/%s' % (self.tid, team_id))
+        body = self._get(fetcher, url)
+        if body is None:
+            team = self.teams.get(team_id)
+            if team is not None and team.get('flag_url'):
+                self._sync_flag(fetcher, team_id, urljoin(url, team['flag_url']))
+            return None
+
+        team = json.loads(body.decode('utf-8'))['team']
+        team = {
+            'name' : team.get('name'),
+            'roster' : team.get('roster'),
+            'flag_url' : team.get('flag_url'),
+        }
+        if team['flag_url']:
+            self._sync_flag(fetcher, team_id, urljoin(url, team['flag_url']))
+        return team
+
+    def _sync_flag(self, fetcher, team_id, url):
+        path = self.flag_path(team_id)
+        body = self._get(fetcher, url, cached=os.path.exists(path))
+        if body is None:
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(body)
+        os.replace(path + '.tmp', path)
+
+    def _get(self, fetcher, url, cached=True):
+        # Conditional GET: returns the body, or None if it hasn't changed since
+        # the copy we already have.
+        headers = {}
+        validator = self.validators.get(url) if cached else None
+        if validator:
+            if validator.get('etag'):
+                headers['If-None-Match'] = validator['etag']
+            if validator.get('last_modified'):
+                headers['If-Modified-Since'] = validator['last_modified']
+
+        status, response_headers, body = fetcher.fetch(url, headers)
+        with self._lock:
+            self.requests += 1
+            if status == 304:
+                self.not_modified += 1
+                return None
+            if status != 200:
+                raise IOError("HTTP %d fetching %s" % (status, url))
+            self.validators[url] = {
+                'etag' : response_headers.get('ETag'),
+                'last_modified' : response_headers.get('Last-Modified'),
+            }
+        return body
+
+class StoreScores(object):
+    # UWHScores client that answers from TournamentStores on disk, keeping them
+    # fresh in the background. Tournaments that aren't in the store yet are
+    # fetched in full on first use; until that finishes, requests fall through
+    # to `fetcher`.
+    #
+    # With follow=True some other process keeps the store up to date, and this
+    # one only reloads what it saved, checking every `refresh` seconds. A
+    # follower can do without a `fetcher` entirely, never going to the network
+    # itself: whatever the store doesn't have yet calls back with None.
+    def __init__(self, fetcher, root=None, refresh=60.0, follow=False):
+        self.fetcher = fetcher
+        self.base_url = fetcher.base_url if fetcher is not None else None
+        self.root = root or default_store_dir()
+        self.refresh = refresh
+        self.follow = follow
+        self._stores = {}
+        self._syncing = set()
+        self._last_sync = {}
+        self._lock = threading.Lock()
+
+        if refresh:
+            threading.Thread(target=self._refresh_loop, name='store-refresh',
+                             daemon=True).start()
+
+    def store(self, tid):
+        store = self._stores.get(tid)
+        if store is None:
+            store = self._stores[tid] = TournamentStore(self.root, tid)
+        return store
+
+    def prefetch(self, tid):
+        # Blocking: pull in the whole tournament.
+        start = time.monotonic()
+        store = self.store(tid)
+        try:
+            store.sync(self.fetcher)
+        except Exception as e:
+            print("Prefetching tournament %s failed, using what is already stored: %s" % (tid, e))
+            return store
+        print("Prefetched tournament %s: %d games, %d teams, %d requests (%d not modified) in %.1fs" % (
+            tid, len(store.games), len(store.teams), store.requests,
+            store.not_modified, time.monotonic() - start))
+        return store
+
+    def get_tournament(self, tid, callback):
+        store = self._lookup(tid)
+        if store is not None and store.tournament is not None:
+            callback(store.tournament)
+        elif self.fetcher is not None:
+            self.fetcher.get_tournament(tid, callback)
+        else:
+            callback(None)
+
+    def get_game_list(self, tid, callback):
+        store = self._lookup(tid)
+        if store is not None and store.games:
+            callback([store.games[gid] for gid in sorted(store.games)])
+        elif self.fetcher is not None:
+            self.fetcher.get_game_list(tid, callback)
+        else:
+            callback(None)
+
+    def get_game(self, tid, gid, callback):
+        store = self._lookup(tid)
+        game = store.games.get(gid) if store is not None else None
+        if game is not None:
+            callback(game)
+        elif self.fetcher is not None:
+            self.fetcher.get_game(tid, gid, callback)
+        else:
+            callback(None)
+
+    def get_roster(self, tid, team_id, callback):
+        store = self._lookup(tid)
+        team = store.teams.get(team_id) if store is not None else None
+        if team is not None and team['roster'] is not None:
+            callback(team['roster'])
+        elif self.fetcher is not None:
+            self.fetcher.get_roster(tid, team_id, callback)
+        else:
+            callback(None)
+
+    def get_team_flag(self, tid, team_id, callback, immediate=False):
+        store = self._lookup(tid)
+        if store is not None:
+            try:
+                with open(store.flag_path(team_id), 'rb') as f:
+                    callback(io.BytesIO(f.read()))
+                return
+            except OSError:
+                pass
+        if self.fetcher is not None:
+            self.fetcher.get_team_flag(tid, team_id, callback, immediate)
+        else:
+            callback(None)
+
+    def drain(self):
+        if self.fetcher is None:
+            return 0
+        return self.fetcher.drain()
+
+    def _lookup(self, tid):
+        if tid is None:
+            return None
+        store = self.store(tid)
+        if not store.complete() and not self.follow:
+            self._sync_in_background(tid)
+        return store
+
+    def _sync_in_background(self, tid, retry=30.0):
+        now = time.monotonic()
+        with self._lock:
+            if tid in self._syncing or now - self._last_sync.get(tid, -retry) < retry:
+                return
+            self._syncing.add(tid)
+            self._last_sync[tid] = now
+        def sync():
+            try:
+                self.store(tid).sync(self.fetcher)
+            except Exception as e:
+                print("Syncing tournament %s failed: %s" % (tid, e))
+            finally:
+                with self._lock:
+                    self._syncing.discard(tid)
+        threading.Thread(target=sync, name='store-sync', daemon=True).start()
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh)
+            for tid in list(self._stores):
+                if not self.follow:
+                    self._sync_in_background(tid, retry=0)
+                elif self._stores[tid].changed_on_disk():
+                    self._stores[tid].load()
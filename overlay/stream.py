@@ -0,0 +1,99 @@
+import time
+from fractions import Fraction
+
+# Streaming the overlay as video, to a file or down a pipe into an encoder,
+# at a fixed frame rate.
+
+class Y4MFormat(object):
+    # YUV4MPEG2, 4:4:4 planar, full range BT.601 as PIL converts to YCbCr.
+    # Transparent pixels come out black, so use RawFormat to keep the key.
+    name = 'y4m'
+
+    def __init__(self, size, fps):
+        self.size = size
+        self.fps = Fraction(fps).limit_denominator(1001)
+
+    def header(self):
+        return ("YUV4MPEG2 W%d H%d F%d:%d Ip A1:1 C444 XCOLORRANGE=FULL\n" % (
+            self.size[0], self.size[1], self.fps.numerator, self.fps.denominator)).encode()
+
+    def frame(self, image):
+        ycbcr = image.convert('RGB').convert('YCbCr')
+        return b'FRAME\n' + b''.join(plane.tobytes() for plane in ycbcr.split())
+
+class RawFormat(object):
+    # Bare RGBA frames, one after the other, as ffmpeg's rawvideo reads them
+    # with -f rawvideo -pix_fmt rgba -s WxH -r FPS.
+    name = 'rgba'
+
+    def __init__(self, size, fps):
+        self.size = size
+        self.fps = fps
+
+    def header(self):
+        return b''
+
+    def frame(self, image):
+        return image.tobytes()
+
+FORMATS = {
+    Y4MFormat.name : Y4MFormat,
+    RawFormat.name : RawFormat,
+}
+
+class PacedWriter(object):
+    # Writes one frame every 1/fps seconds of stream time. A frame is only
+    # rendered and encoded when something on screen changed; otherwise the
+    # last encoded buffer goes out again. When rendering falls more than a
+    # frame behind the clock, the frames it missed repeat the last buffer
+    # instead of being rendered late, so the stream keeps its rate.
+    #
+    # With realtime=False nothing waits on the clock: stream time is just the
+    # frame count over fps, and advance(t) is called before every frame so the
+    # caller can move the game state along, e.g. from a recording.
+    def __init__(self, out, format):
+        self.out = out
+        self.format = format
+        self.frames = 0
+        self.rendered = 0
+        self.repeated = 0
+        self.late = 0
+        self._buffer = None
+
+    def run(self, ov, duration=None, realtime=True, advance=None):
+        fps = float(self.format.fps)
+        self.out.write(self.format.header())
+        start = time.monotonic()
+        while duration is None or self.frames < duration * fps:
+            t = self.frames / fps
+            if advance is not None:
+                advance(t)
+            behind = False
+            if realtime:
+                now = time.monotonic() - start
+                if now < t:
+                    time.sleep(t - now)
+                behind = now - t > 1 / fps
+
+            ov.refresh()
+            ov.poll()
+            # Checking stale() takes the change, so don't when it can't be drawn.
+            changed = not behind and ov.stale()
+            painted = changed or self._buffer is None
+            if painted:
+                frame = ov.paint()
+                self._buffer = self.format.frame(frame)
+                self.rendered += 1
+                ov.profiler.frame_done()
+            elif behind:
+                self.late += 1
+            else:
+                self.repeated += 1
+            self.out.write(self._buffer)
+            self.frames += 1
+            if painted:
+                ov.frame_shown()
+
+    def summary(self):
+        return "%d frames: %d rendered, %d unchanged, %d repeated while behind" % (
+            self.frames, self.rendered, self.repeated, self.late)
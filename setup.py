@@ -4,5 +4,7 @@ setup(
     name='uwh-overlay',
     version='1.0.0',
     packages=find_packages(),
-    scripts=['bin/uwh-overlay'],
+    scripts=['bin/uwh-overlay', 'bin/uwh-overlay-bench', 'bin/uwh-scores-standin',
+             'bin/uwh-overlay-shm-check', 'bin/uwh-overlay-host',
+             'bin/uwh-state-feed', 'bin/uwh-state-record'],
 )